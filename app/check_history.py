@@ -0,0 +1,127 @@
+"""
+Consistency check of the indexes kept by the Application through undo and
+redo. A complete Person with a Trick is replaced with a new, empty Person of
+the same name, then with a Person imported from an archive, and each change
+is undone and redone. After each step every
+Trick found by the full-text index has to exist in the stored Person, and the
+validation badge has to describe the stored Person.
+
+The Application is created without it's window: only the undo history and
+the indexes are started.
+
+Run: python check_history.py
+"""
+
+import os
+import sys
+import tempfile
+
+from game_master_app import Application, Location, Person, Skill, Statistic, \
+    export_archive, import_archive
+
+
+def new_application():
+    """Create an Application with no window, Persons and Locations."""
+    application = Application.__new__(Application)
+    application.required_statistics = 6
+    application.palette_dirty = True
+    application.persons = {"Type": Person}
+    application.locations = {"Type": Location}
+    application.start_session()
+    return application
+
+
+def complete_person(name: str):
+    """Create a Person with all Statistics set and a searchable Trick."""
+    person = Person(name)
+    for statistic in Statistic.Statistics:
+        person.set_statistic(statistic, 12)
+    person.set_trick("Szybki strzał", "Strzela dwa razy w jednej turze.",
+                     "Pistolety", 1)
+    return person
+
+
+def empty_person(name: str):
+    """Create a Person the way the new Person form does."""
+    person = Person(name)
+    for statistic in Statistic.Statistics:
+        person.set_statistic(statistic, 0)
+    for skill in Skill.Statistics:
+        person.set_skill(skill, 0, 0)
+    return person
+
+
+def inconsistencies(application: Application, step: str):
+    """
+    Compare the indexes with the stored Persons.
+
+    :param application: an instance of the Application class.
+    :param step: str, name of the checked step.
+    :return: list of str descriptions of inconsistencies.
+    """
+    found = []
+    for key in application.search_index.documents:
+        if key[0] == "trick" and (
+                key[1] not in application.persons or
+                key[2] not in application.persons[key[1]].tricks):
+            found.append("{0}: nieaktualna sztuczka {1} w indeksie".format(
+                step, key[1:]))
+    for name, person in application.persons.items():
+        if name == "Type":
+            continue
+        for trick in person.tricks:
+            if ("trick", name, trick) not in \
+                    application.search_index.documents:
+                found.append("{0}: brak sztuczki {1} w indeksie".format(
+                    step, (name, trick)))
+        complete = all(
+            isinstance(person.statistics.get(statistic), Statistic) and
+            person.statistics[statistic].value > 0
+            for statistic in Statistic.Statistics)
+        if application.validator.is_complete(name) != complete:
+            found.append("{0}: błędna odznaka postaci {1}".format(step, name))
+    return found
+
+
+def check_replace():
+    """Replace a Person, undo and redo the change."""
+    application = new_application()
+    application.set_person(complete_person("Adam"))
+    found = inconsistencies(application, "dodanie")
+    application.set_person(empty_person("Adam"))
+    found += inconsistencies(application, "zastąpienie")
+    application.history.undo()
+    found += inconsistencies(application, "cofnięcie")
+    application.history.redo()
+    found += inconsistencies(application, "ponowienie")
+    return found
+
+
+def check_import():
+    """Import a Person over an existing one, undo and redo the import."""
+    application = new_application()
+    application.set_person(complete_person("Adam"))
+    imported = Person("Adam")
+    imported.set_statistic("Budowa", 10)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "archiwum")
+        export_archive(path, {"persons": {"Adam": imported}})
+        application.import_records(import_archive(path))
+    found = inconsistencies(application, "import")
+    application.history.undo()
+    found += inconsistencies(application, "cofnięcie importu")
+    application.history.redo()
+    found += inconsistencies(application, "ponowienie importu")
+    return found
+
+
+if __name__ == '__main__':
+    failed = False
+    for title, check in (("Zastąpienie postaci", check_replace),
+                         ("Import postaci", check_import)):
+        failures = check()
+        for failure in failures:
+            print("BŁĄD: {0}".format(failure))
+        print("{0}: {1} niezgodności".format(title, len(failures)))
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
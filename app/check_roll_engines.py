@@ -0,0 +1,209 @@
+"""
+Equivalence harness of the 3d20 roll engines. The reference engine repeats
+the original roll_for_skill and roll_for_statistic loops of the Application
+step by step, with it's own copy of the original modifiers, and every
+optimized engine is fed with the same dice: all 8000 results of 3d20 for each
+difficulty and Skill level, and a seeded stream of random tests. Tests which
+made the original engine raise KeyError are checked separately: the optimized
+engines have to clamp them to the easiest modifier. Mismatches and throughput
+of each engine are reported side by side.
+
+Run: python check_roll_engines.py [number of random tests] [seed]
+"""
+
+import sys
+import time
+from random import Random
+
+from functools import partial
+
+from game_master_app import ALL_DICE, resolve_test, resolve_tests
+
+Modifiers = {-5: -15, -4: -11, -3: -8, -2: -5, -1: -2, 0: 0, 1: 2, 2: 5,
+             3: 8, 4: 11, 5: 15, 6: 20, 7: 24}
+Difficulties = range(-2, 8)
+SkillPoints = [None] + list(range(0, 9))
+Sliders = range(0, 3)
+
+
+def reference_test(dice: list, value: int, difficulty: int, sliders: int = 0,
+                   skill_points: int = None, clamp: bool = False):
+    """
+    Resolve a test exactly the way the original run_test did. Combinations
+    which made it's sliders dictionary raise KeyError are not supported,
+    unless clamped to the easiest modifier.
+
+    :param dice: list, three results rolled on d20.
+    :param value: int, value of the tested (or linked) Statistic.
+    :param difficulty: int, difficulty level of the test (-2 to 7).
+    :param sliders: int, sliders provided by Tricks (Skill tests only).
+    :param skill_points: int, points of the tested Skill, None for Statistics.
+    :param clamp: bool, if modifiers easier than the table are clamped to it.
+    :return: list, the same result as resolve_test returns.
+    """
+    if skill_points is None:
+        real_difficulty = Modifiers[difficulty]
+    else:
+        level = difficulty - (sliders + int(skill_points / 4))
+        real_difficulty = Modifiers[max(level, -5) if clamp else level]
+    roll_result = list(dice)
+    original_roll_result = roll_result.copy()
+
+    for result in roll_result:
+        if result == 1:
+            real_difficulty -= 3
+        elif result == 20:
+            real_difficulty += 3
+    tested_value = value - real_difficulty
+
+    worst_result = max(roll_result)
+    roll_result.remove(worst_result)
+
+    if skill_points is None:
+        passed = True
+        for result in roll_result:
+            if result > tested_value:
+                passed = False
+        points = max(roll_result) - tested_value if not passed else \
+            abs(max(roll_result) - tested_value)
+        return [passed, original_roll_result, roll_result, points,
+                tested_value]
+
+    unmodified = roll_result.copy()
+    points = skill_points
+    while points > 0:
+        points -= 1
+        for i in range(0, 2):
+            if roll_result[i] == max(roll_result) and roll_result[i] > 1:
+                roll_result[i] -= 1
+                break
+
+    if max(roll_result) > tested_value:
+        return [False, original_roll_result, roll_result,
+                max(roll_result) - tested_value, tested_value, unmodified]
+    return [True, original_roll_result, roll_result,
+            abs(max(roll_result) - tested_value), tested_value, unmodified]
+
+
+def supported(difficulty: int, sliders: int, skill_points: int):
+    """Check if the original engine could resolve such a test at all."""
+    if skill_points is None:
+        return True
+    return difficulty - sliders - int(skill_points / 4) >= -5
+
+
+def exhaustive_workload(value: int = 12, clamped: bool = False):
+    """
+    Group every 3d20 result with every difficulty and Skill level.
+
+    :param value: int, value of the tested Statistic.
+    :param clamped: bool, if only tests unsupported by the original engine
+        are grouped instead of the supported ones.
+    :return: list, ((value, difficulty, sliders, skill_points), dice) tuples.
+    """
+    return [((value, difficulty, sliders, skill_points), ALL_DICE)
+            for difficulty in Difficulties for skill_points in SkillPoints
+            for sliders in (Sliders if skill_points is not None else [0])
+            if supported(difficulty, sliders, skill_points) != clamped]
+
+
+def random_workload(count: int, seed: int = 0):
+    """
+    Draw random tests from a seeded generator, grouped by test parameters.
+
+    :param count: int, number of tests.
+    :param seed: int, seed of the generator.
+    :return: list, ((value, difficulty, sliders, skill_points), dice) tuples.
+    """
+    rng = Random(seed)
+    groups = {}
+    while count > 0:
+        skill_points = rng.choice(SkillPoints)
+        sliders = rng.choice(Sliders) if skill_points is not None else 0
+        difficulty = rng.choice(Difficulties)
+        if not supported(difficulty, sliders, skill_points):
+            continue
+        key = (rng.randint(1, 25), difficulty, sliders, skill_points)
+        groups.setdefault(key, []).append(
+            (rng.randint(1, 20), rng.randint(1, 20), rng.randint(1, 20)))
+        count -= 1
+    return list(groups.items())
+
+
+def run_scalar(engine, workload: list):
+    return [engine(list(dice), *parameters) for parameters, stream in workload
+            for dice in stream]
+
+
+def run_batched(engine, workload: list):
+    results = []
+    for parameters, stream in workload:
+        results.extend(engine(stream, *parameters))
+    return results
+
+
+def compare(workload: list, reference=reference_test):
+    """
+    Run all engines on a workload and compare them with the reference.
+
+    :param workload: list, ((value, difficulty, sliders, skill_points), dice)
+        tuples.
+    :param reference: callable, reference engine.
+    :return: dict, name of engine -> (mismatches, tests per second, first
+        mismatching (parameters, dice, expected, got) or None).
+    """
+    tests = sum(len(stream) for _, stream in workload)
+    cases = [(parameters, dice) for parameters, stream in workload
+             for dice in stream]
+    report = {}
+
+    start = time.perf_counter()
+    expected = run_scalar(reference, workload)
+    report["reference"] = (0, tests / (time.perf_counter() - start), None)
+
+    start = time.perf_counter()
+    results = run_scalar(resolve_test, workload)
+    elapsed = time.perf_counter() - start
+    mismatches = [i for i in range(0, tests) if results[i] != expected[i]]
+    report["resolve_test"] = (len(mismatches), tests / elapsed, (
+        cases[mismatches[0]] + (expected[mismatches[0]],
+                                results[mismatches[0]])
+        if mismatches else None))
+
+    start = time.perf_counter()
+    results = run_batched(resolve_tests, workload)
+    elapsed = time.perf_counter() - start
+    mismatches = [i for i in range(0, tests)
+                  if results[i] != (expected[i][0], expected[i][3])]
+    report["resolve_tests"] = (len(mismatches), tests / elapsed, (
+        cases[mismatches[0]] + ((expected[mismatches[0]][0],
+                                 expected[mismatches[0]][3]),
+                                results[mismatches[0]])
+        if mismatches else None))
+    return report
+
+
+def print_report(title: str, report: dict):
+    print(title)
+    for engine in report:
+        mismatches, rate, example = report[engine]
+        print("  {0:<14} {1:>8} niezgodności {2:>12,.0f} testów/s".format(
+            engine, mismatches, rate))
+        if example is not None:
+            print("    np. {0}".format(example))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    exhaustive = compare(exhaustive_workload())
+    print_report("Wszystkie wyniki 3d20:", exhaustive)
+    clamped = compare(exhaustive_workload(clamped=True),
+                      partial(reference_test, clamp=True))
+    print_report("Testy poza tabelą (przycięte):", clamped)
+    randomized = compare(random_workload(count, seed))
+    print_report("Losowe testy ({0}, ziarno {1}):".format(count, seed),
+                 randomized)
+    failed = any(exhaustive[engine][0] or clamped[engine][0] or
+                 randomized[engine][0] for engine in exhaustive)
+    sys.exit(1 if failed else 0)
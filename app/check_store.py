@@ -0,0 +1,68 @@
+"""
+Timing check of the shared Store: a batch of generated NPCs is saved, then
+deleted at once (like an undone batch generation), and both syncs have to
+finish within the time limit. A second instance has to see the deletions and
+the file has to be compacted afterwards.
+
+Run: python check_store.py [number of NPCs] [limit in seconds]
+"""
+
+import os
+import shelve
+import sys
+import tempfile
+import time
+from random import Random
+
+from game_master_app import Archetype, Store, generate_npcs
+
+
+def check(count: int, limit: float):
+    """
+    Save and delete a batch of NPCs, timing both syncs.
+
+    :param count: int, number of NPCs.
+    :param limit: float, maximum time of one sync in seconds.
+    :return: list of str descriptions of failures, empty if all passed.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "saved_data")
+        store, other = Store(path), Store(path)
+        other.sync({})
+        persons = {person.name: person for _, person in generate_npcs(
+            Archetype.Archetypes["Bandyta"], count, Random(0))}
+
+        start = time.perf_counter()
+        store.sync({("person", name): persons[name] for name in persons})
+        saved = time.perf_counter() - start
+        print("  zapis {0} postaci: {1:.2f} s".format(count, saved))
+
+        start = time.perf_counter()
+        store.sync({("person", name): None for name in persons})
+        deleted = time.perf_counter() - start
+        print("  usunięcie {0} postaci: {1:.2f} s".format(count, deleted))
+
+        for title, elapsed in (("zapis", saved), ("usunięcie", deleted)):
+            if elapsed > limit:
+                failures.append("{0} trwał {1:.2f} s > {2} s".format(
+                    title, elapsed, limit))
+        remote, _ = other.sync({})
+        if any(remote.get(("person", name)) is not None for name in persons):
+            failures.append("drugie okno nie widzi usunięć")
+        if Store(path).load()[0]:
+            failures.append("usunięte postacie zostały wczytane")
+        with store.locked(), shelve.open(path) as shelf:
+            if len(shelf) > 10:
+                failures.append("plik nie został skompaktowany")
+    return failures
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    limit = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    print("Synchronizacja {0} postaci:".format(count))
+    failures = check(count, limit)
+    for failure in failures:
+        print("  BŁĄD: {0}".format(failure))
+    sys.exit(1 if failures else 0)
@@ -9,12 +9,42 @@ window.
 
 Another functionality is a repository of game-locations with a short text-de-
 scriptions and links to the google-maps geolocations. One click opens a new tab
-in the default browser with the g-maps address.
+in the default browser with the g-maps address. Coordinates parsed from these
+links are kept in a spatial index, so nearby places and travel-times are found
+offline.
+
+Descriptions of Locations and Tricks are searchable with the full-text index
+which folds Polish diacritics and ranks results with BM25.
 """
 
+import dbm
+import glob
+import heapq
+import io
+import json
+import lzma
+import math
+import multiprocessing
+import os
+import pickle
+import re as regex
 import shelve
-from functools import partial
+import sys
+from bisect import bisect_left
+import time
+import zlib
+from array import array
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import accumulate, compress, repeat
 import webbrowser
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 from random import *
 from tkinter import *
 from tkinter import filedialog
@@ -72,7 +102,7 @@ class Skill:
         :param name: str name of a Skill
         :param value: value of a Skill (in range: 1-8)
         :param sliders: amount of sliders gained (each makes tests 1-level easier)
-        :param statistic: a Statistic which is tested along with this Skill
+        :param statistic: str, name of a Statistic tested along with this Skill
         """
         self.type = "Skill"
         self.name = name
@@ -80,6 +110,27 @@ class Skill:
         self.sliders = sliders
         self.statistic = statistic
 
+    @classmethod
+    def default_statistic(cls, name: str):
+        """
+        Get the name of the Statistic tested along with a typical Skill. Names
+        of Skills are matched case-insensitively.
+
+        :param name: str, name of the Skill.
+        :return: str, name of the Statistic or None for unknown Skills.
+        """
+        name = name.strip().lower()
+        for skill, statistic in cls.Statistics.items():
+            if skill.lower() == name:
+                return statistic
+        return None
+
+    def __setstate__(self, state: dict):
+        """Replace values of Statistics snapshotted by older saves with links."""
+        self.__dict__.update(state)
+        if not isinstance(self.statistic, str):
+            self.statistic = Skill.default_statistic(self.name)
+
 
 class Trick:
     """This class represents a Neuroshima Tricks attributes."""
@@ -117,18 +168,110 @@ class Person:
         self.name = name
         self.statistics = {}
         self.tricks = {}
+        self.links = None
+        self.dependents = None
+        self.tested_values = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for derived in ("links", "dependents", "tested_values"):
+            state.pop(derived, None)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.links = None
+        self.dependents = None
+        self.tested_values = {}
+
+    def update(self, other):
+        """
+        Take over the state of the same Person changed in other instance of
+        the application. This object and it's dicts are kept, because opened
+        character-sheets and the undo history refer to them.
+
+        :param other: an instance of the Person class.
+        """
+        state = other.__getstate__()
+        for name in ("statistics", "tricks"):
+            getattr(self, name).clear()
+            getattr(self, name).update(state.pop(name))
+        self.__setstate__(state)
 
     def set_statistic(self, name: str, value: int):
         if name not in self.statistics:
             self.statistics[name] = Statistic(name, value)
         else:
             self.statistics[name].value = value
+        self.statistic_changed(name)
 
     def set_skill(self, name: str, slider: int, value: int):
         if name not in self.statistics:
-            self.statistics[name] = Skill(name, slider, value)
+            self.statistics[name] = Skill(name, value, slider,
+                                          Skill.default_statistic(name))
         else:
             self.statistics[name].value = value
+        self.statistic_changed(name)
+
+    def linked_value(self, skill: str):
+        """
+        Get the value of a Statistic tested along with a Skill. Values are
+        cached until the linked Statistic or the Skill itself changes.
+
+        :param skill: str, name of the Skill.
+        :return: int, value of the linked Statistic, 0 if it is missing.
+        """
+        if skill not in self.tested_values:
+            linked = self.get_links().get(skill)
+            entry = self.statistics.get(linked)
+            self.tested_values[skill] = entry.value if isinstance(
+                entry, Statistic) else 0
+        return self.tested_values[skill]
+
+    def dependent_skills(self, statistic: str):
+        """
+        Get names of Skills linked to a Statistic.
+
+        :param statistic: str, name of the Statistic.
+        :return: set of str names of Skills.
+        """
+        self.get_links()
+        return self.dependents.get(statistic, set())
+
+    def statistic_changed(self, name: str):
+        """
+        Update Skill links and drop cached values depending on an entry which
+        was set, replaced or deleted.
+
+        :param name: str, name of the changed Statistic or Skill.
+        """
+        if self.links is None:
+            self.tested_values.clear()
+            return
+        self.unlink(name)
+        self.link(name)
+        self.tested_values.pop(name, None)
+        for skill in self.dependents.get(name, ()):
+            self.tested_values.pop(skill, None)
+
+    def get_links(self):
+        if self.links is None:
+            self.links = {}
+            self.dependents = {}
+            for name in self.statistics:
+                self.link(name)
+        return self.links
+
+    def link(self, name: str):
+        entry = self.statistics.get(name)
+        if isinstance(entry, Skill) and entry.statistic is not None:
+            self.links[name] = entry.statistic
+            self.dependents.setdefault(entry.statistic, set()).add(name)
+
+    def unlink(self, name: str):
+        linked = self.links.pop(name, None)
+        if linked is not None:
+            self.dependents[linked].discard(name)
 
     def set_trick(self, name: str, description: str, statistic: str = None,
                   slider: int = 0, repeat: bool = False,
@@ -145,25 +288,1243 @@ class Person:
             self.tricks[name].modifier = modifier
 
 
+class Archetype:
+    """
+    A template of NPCs: which Statistics are the strongest ones, which Skills
+    the NPC is trained in and which Tricks it may know.
+    """
+
+    Values = list(range(8, 21))
+
+    def __init__(self, name: str, main_statistics: list, skills: list,
+                 skill_points: int, tricks: list = None,
+                 trick_chance: float = 0.3):
+        """
+        Creates a new NPC archetype.
+
+        :param name: str, name of the archetype.
+        :param main_statistics: list, Statistics rolled higher than the others.
+        :param skills: list, names of Skills the NPC is trained in.
+        :param skill_points: int, points distributed over the skills.
+        :param tricks: list, (name, description, statistic, slider) tuples.
+        :param trick_chance: float, probability of knowing each of tricks.
+        """
+        self.name = name
+        self.main_statistics = main_statistics
+        self.skills = skills
+        self.skill_points = min(skill_points, 8 * len(skills))
+        self.tricks = tricks if tricks is not None else []
+        self.trick_chance = trick_chance
+
+    def roll_statistics(self, count: int, rng):
+        """
+        Roll values of all Statistics for a batch of NPCs, column by column.
+
+        :param count: int, number of NPCs in the batch.
+        :param rng: an instance of random.Random.
+        :return: dict, name of Statistic -> list of values.
+        """
+        columns = {}
+        for statistic in Statistic.Statistics:
+            if statistic in self.main_statistics:
+                cum_weights = MAIN_STATISTIC_CUM_WEIGHTS
+            else:
+                cum_weights = STATISTIC_CUM_WEIGHTS
+            columns[statistic] = rng.choices(self.Values,
+                                             cum_weights=cum_weights, k=count)
+        return columns
+
+    def roll_skills(self, count: int, rng):
+        """
+        Distribute skill-points budget over the archetype's Skills for a batch
+        of NPCs. No Skill gets more than 8 points.
+
+        :param count: int, number of NPCs in the batch.
+        :param rng: an instance of random.Random.
+        :return: list of dicts, name of Skill -> value, one per NPC.
+        """
+        budget = self.skill_points
+        picks = rng.choices(self.skills, k=budget * count)
+        distributions = []
+        for i in range(0, count):
+            values = Counter(picks[i * budget:(i + 1) * budget])
+            overflow = 0
+            for skill in self.skills:
+                if values[skill] > 8:
+                    overflow += values[skill] - 8
+                    values[skill] = 8
+            for skill in self.skills:
+                if overflow == 0:
+                    break
+                moved = min(8 - values[skill], overflow)
+                values[skill] += moved
+                overflow -= moved
+            distributions.append(values)
+        return distributions
+
+
 class Location:
     """Class for an geo-locations links for in-game places."""
 
-    def __init__(self, name: str, address: str, description: str = None):
+    def __init__(self, name: str, address: str, description: str = None,
+                 encounters=None):
         """
         Creates a new g-maps location.
 
         :param name: str, name of the place.
         :param address: str, http address to the g-maps geo-location of place.
         :param description: str, description of the place.
+        :param encounters: an instance of the EncounterTable class.
         """
         self.name = name
         self.address = address
         self.description = description
+        self.coordinates = parse_coordinates(address)
+        self.encounters = encounters if encounters is not None else \
+            EncounterTable()
+
+    def __setstate__(self, state: dict):
+        """Restore Locations pickled before coordinates or encounters."""
+        self.__dict__.update(state)
+        if "coordinates" not in state:
+            self.coordinates = parse_coordinates(self.address)
+        if "encounters" not in state:
+            self.encounters = EncounterTable()
+
+    def update(self, other):
+        """
+        Take over the state of the same Location changed in other instance of
+        the application.
+
+        :param other: an instance of the Location class.
+        """
+        self.__dict__.update(other.__dict__)
+
+
+class EncounterTable:
+    """
+    Weighted table of encounters in a Location. Entries are names of stored
+    Persons or of NPC Archetypes. The Walker's alias table is computed when
+    the entries are set, so every draw costs O(1).
+    """
+
+    def __init__(self, entries: list = None):
+        """
+        Creates a new encounter table.
+
+        :param entries: list, (name, weight) tuples.
+        """
+        self.set_entries(entries if entries is not None else [])
+
+    def set_entries(self, entries: list):
+        """
+        Replace entries of the table and rebuild the alias table.
+
+        :param entries: list, (name, weight) tuples with positive, finite
+            weights.
+        """
+        for name, weight in entries:
+            if not math.isfinite(weight) or weight <= 0:
+                raise ValueError(
+                    "waga {0} musi być dodatnią, skończoną liczbą".format(name))
+        self.entries = list(entries)
+        self.names = [name for name, _ in entries]
+        count = len(entries)
+        total = sum(weight for _, weight in entries)
+        scaled = [weight * count / total for _, weight in entries]
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(0, count))
+        small = [i for i in range(0, count) if scaled[i] < 1]
+        large = [i for i in range(0, count) if scaled[i] >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+    def draw(self, rng=None):
+        """
+        Draw one entry of the table.
+
+        :param rng: an instance of random.Random, module generator by default.
+        :return: str, name of the drawn entry, None if the table is empty.
+        """
+        if not self.entries:
+            return None
+        point = (rng.random() if rng is not None else random()) * \
+            len(self.entries)
+        i = int(point)
+        if point - i < self.probabilities[i]:
+            return self.names[i]
+        return self.names[self.aliases[i]]
+
+    def draw_many(self, count: int, rng=None):
+        """
+        Draw many entries of the table at once, eg. a whole patrol.
+
+        :param count: int, number of draws.
+        :param rng: an instance of random.Random, module generator by default.
+        :return: list of str names of drawn entries.
+        """
+        if not self.entries:
+            return []
+        size = len(self.entries)
+        points = [(rng.random() if rng is not None else random()) * size
+                  for _ in range(0, count)]
+        names, probabilities, aliases = self.names, self.probabilities, \
+            self.aliases
+        return [names[int(point)] if point - int(point) <
+                probabilities[int(point)] else names[aliases[int(point)]]
+                for point in points]
+
+
+class LocationIndex:
+    """
+    Spatial index (k-d tree) of Locations with known coordinates. Points are
+    kept as 3D unit-vectors, so euclidean distance in the tree grows along with
+    the great-circle distance on the Earth surface.
+    """
+
+    TravelSpeeds = {"pieszo": 5, "konno": 10, "rower": 15, "motocykl": 60,
+                    "samochód": 50, "ciężarówka": 40}
+
+    def __init__(self, locations: dict = None):
+        """
+        Creates a new spatial index.
+
+        :param locations: dict, Locations to be indexed at once.
+        """
+        self.points = {}
+        self.tree = None
+        self.dirty = False
+        if locations is not None:
+            for name in locations:
+                if isinstance(locations[name], Location):
+                    self.add(locations[name])
+
+    def add(self, location: Location):
+        """
+        Add or move a Location in the index. Locations without coordinates are
+        dropped from the index.
+
+        :param location: an instance of the Location class.
+        """
+        if location.coordinates is None:
+            self.remove(location.name)
+        else:
+            self.points[location.name] = location.coordinates
+            self.dirty = True
+
+    def remove(self, name: str):
+        """
+        Remove a Location from the index.
+
+        :param name: str, name of the Location.
+        """
+        if self.points.pop(name, None) is not None:
+            self.dirty = True
+
+    def within(self, coordinates: tuple, radius: float):
+        """
+        Find all Locations in the radius around a point.
+
+        :param coordinates: tuple, (latitude, longitude) of the point.
+        :param radius: float, radius in kilometers.
+        :return: list, (distance in km, name) tuples sorted by distance.
+        """
+        target = unit_vector(coordinates)
+        chord = 2 * math.sin(min(radius / EARTH_RADIUS, math.pi) / 2)
+        found = []
+        self.search_within(self.get_tree(), target, chord * chord, found)
+        return sorted((distance_km(coordinates, self.points[name]), name)
+                      for name in found)
+
+    def nearest(self, coordinates: tuple, count: int = 1, accept=None):
+        """
+        Find Locations nearest to a point.
+
+        :param coordinates: tuple, (latitude, longitude) of the point.
+        :param count: int, how many Locations should be found.
+        :param accept: callable, optional filter taking a Location name.
+        :return: list, (distance in km, name) tuples sorted by distance.
+        """
+        heap = []
+        self.search_nearest(self.get_tree(), unit_vector(coordinates), count,
+                            accept, heap)
+        return sorted((distance_km(coordinates, self.points[name]), name)
+                      for _, name in heap)
+
+    def travel_time(self, origin: str, target: str, mode: str = "pieszo"):
+        """
+        Estimate travel-time between two indexed Locations.
+
+        :param origin: str, name of the starting Location.
+        :param target: str, name of the destination.
+        :param mode: str, mean of transport, key of TravelSpeeds dict.
+        :return: float, travel-time in hours.
+        """
+        distance = distance_km(self.points[origin], self.points[target])
+        return distance / self.TravelSpeeds[mode]
+
+    def get_tree(self):
+        """Rebuild the k-d tree if the index changed since the last query."""
+        if self.dirty:
+            items = [(unit_vector(self.points[name]), name)
+                     for name in self.points]
+            self.tree = self.build(items, 0)
+            self.dirty = False
+        return self.tree
+
+    def build(self, items: list, depth: int):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        median = len(items) // 2
+        point, name = items[median]
+        return (point, name, axis, self.build(items[:median], depth + 1),
+                self.build(items[median + 1:], depth + 1))
+
+    def search_within(self, node, target, chord2, found):
+        if node is None:
+            return
+        point, name, axis, left, right = node
+        if squared_distance(point, target) <= chord2:
+            found.append(name)
+        difference = target[axis] - point[axis]
+        near, far = (left, right) if difference < 0 else (right, left)
+        self.search_within(near, target, chord2, found)
+        if difference * difference <= chord2:
+            self.search_within(far, target, chord2, found)
+
+    def search_nearest(self, node, target, count, accept, heap):
+        if node is None:
+            return
+        point, name, axis, left, right = node
+        distance = squared_distance(point, target)
+        if accept is None or accept(name):
+            if len(heap) < count:
+                heapq.heappush(heap, (-distance, name))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, name))
+        difference = target[axis] - point[axis]
+        near, far = (left, right) if difference < 0 else (right, left)
+        self.search_nearest(near, target, count, accept, heap)
+        if len(heap) < count or difference * difference < -heap[0][0]:
+            self.search_nearest(far, target, count, accept, heap)
+
+
+class SearchIndex:
+    """
+    Inverted index of free-text descriptions, ranked with BM25. Documents are
+    identified by any hashable key, eg. ("location", name).
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        """Creates a new, empty full-text index."""
+        self.postings = {}
+        self.documents = {}
+        self.total_length = 0
+
+    def add(self, key, text: str):
+        """
+        Index a document or replace it's previous version.
+
+        :param key: hashable identifier of the document.
+        :param text: str, text to be indexed.
+        """
+        self.remove(key)
+        terms = Counter(tokenize(text))
+        self.documents[key] = (terms, sum(terms.values()))
+        self.total_length += self.documents[key][1]
+        for term in terms:
+            self.postings.setdefault(term, {})[key] = terms[term]
+
+    def remove(self, key):
+        """
+        Remove a document from the index.
+
+        :param key: hashable identifier of the document.
+        """
+        if key not in self.documents:
+            return
+        terms, length = self.documents.pop(key)
+        self.total_length -= length
+        for term in terms:
+            del self.postings[term][key]
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def search(self, query: str, limit: int = 20):
+        """
+        Find documents best matching the query.
+
+        :param query: str, searched phrase.
+        :param limit: int, maximum number of results.
+        :return: list, (score, key) tuples sorted from the best match.
+        """
+        count = len(self.documents)
+        if count == 0:
+            return []
+        average_length = self.total_length / count or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) /
+                           (len(posting) + 0.5))
+            for key in posting:
+                frequency = posting[key]
+                norm = self.K1 * (1 - self.B + self.B *
+                                  self.documents[key][1] / average_length)
+                scores[key] = scores.get(key, 0) + \
+                    idf * frequency * (self.K1 + 1) / (frequency + norm)
+        return heapq.nlargest(limit, ((scores[key], key) for key in scores),
+                              key=lambda result: result[0])
+
+
+Archetype.Archetypes = {
+    archetype.name: archetype for archetype in [
+        Archetype("Bandyta", ["Budowa", "Zręczność"],
+                  ["Bijatyka", "Broń biała", "Pistolety", "Zastraszanie",
+                   "Motocykl", "Skradanie"], 12,
+                  [("Twardziel", "Ignoruje pierwszą ranę lekką.", "Budowa", 0)]),
+        Archetype("Żołnierz", ["Zręczność", "Charakter"],
+                  ["Karabiny", "Pistolety", "Kondycja", "Czujność",
+                   "Dowodzenie", "Morale", "Ukrywanie"], 16,
+                  [("Snajper", "Ułatwia strzał z karabinu.", "Karabiny", 1)]),
+        Archetype("Łowca", ["Percepcja", "Zręczność"],
+                  ["Tropienie", "Łowiectwo", "Zdobywanie wody", "Karabiny",
+                   "Skradanie", "Maskowanie"], 14,
+                  [("Tropiciel", "Ułatwia tropienie zwierzyny.", "Tropienie",
+                    1)]),
+        Archetype("Mechanik", ["Spryt", "Zręczność"],
+                  ["Mechanika", "Elektronika", "Samochód", "Ciężarówka",
+                   "Komputery"], 14,
+                  [("Złota rączka", "Naprawia bez narzędzi.", "Mechanika",
+                    1)]),
+        Archetype("Medyk", ["Spryt", "Percepcja"],
+                  ["Pierwsza pomoc", "Wiedza medyczna", "Chirurgia",
+                   "Wyczucie emocji"], 14,
+                  [("Pewna ręka", "Ułatwia operacje.", "Chirurgia", 1)]),
+        Archetype("Handlarz", ["Charakter", "Spryt"],
+                  ["Persfazja", "Blef", "Wyczucie emocji", "Samochód",
+                   "Pistolety"], 12,
+                  [("Nos do interesów", "Lepsze ceny przy handlu.",
+                    "Persfazja", 1)]),
+    ]}
+
+
+def generate_npcs(archetype: Archetype, count: int, rng=None,
+                  batch: int = 1000):
+    """
+    Generate statted NPCs of an archetype. Random numbers are drawn for whole
+    batches at once and NPCs are yielded one by one, so they could be streamed
+    straight to the store.
+
+    :param archetype: an instance of the Archetype class.
+    :param count: int, number of NPCs to generate.
+    :param rng: an instance of random.Random, module generator by default.
+    :param batch: int, number of NPCs rolled at once.
+    :return: generator of (index, Person) tuples, index counted from 1.
+    """
+    rng = rng if rng is not None else Random()
+    skill_statistics = [(skill, Skill.Statistics[skill])
+                        for skill in archetype.skills]
+    generated = 0
+    while generated < count:
+        size = min(batch, count - generated)
+        statistics = archetype.roll_statistics(size, rng)
+        skills = archetype.roll_skills(size, rng)
+        tricks = [rng.random() for _ in range(size * len(archetype.tricks))]
+
+        for i in range(0, size):
+            generated += 1
+            person = Person("{0} #{1}".format(archetype.name, generated))
+            for statistic in Statistic.Statistics:
+                person.statistics[statistic] = Statistic(statistic,
+                                                         statistics[statistic][i])
+            for skill, linked in skill_statistics:
+                person.statistics[skill] = Skill(skill, skills[i][skill], 0,
+                                                 linked)
+            for j, trick in enumerate(archetype.tricks):
+                if tricks[i * len(archetype.tricks) + j] < archetype.trick_chance:
+                    name, description, statistic, slider = trick
+                    person.tricks[name] = Trick(name, description, statistic,
+                                                slider)
+            yield generated, person
+
+
+class History:
+    """
+    Unlimited undo/redo stack of changes made in the dicts of Persons,
+    Locations, Statistics and Tricks. Every change is a compact diff record
+    (dict, key, old value, new value) holding references to the replaced
+    objects, never copies, so memory grows with the number of edits only.
+    """
+
+    Missing = object()
+
+    def __init__(self):
+        """Creates a new, empty history."""
+        self.undo_stack = []
+        self.redo_stack = []
+        self.step = None
+
+    @contextmanager
+    def transaction(self, refresh=None):
+        """
+        Group all changes made inside the with-block into one undo-step.
+
+        :param refresh: callable, redraws the window after undo or redo.
+        """
+        if self.step is not None:
+            yield
+            return
+        self.step = ([], refresh)
+        try:
+            yield
+        finally:
+            step, self.step = self.step, None
+            if step[0]:
+                self.undo_stack.append(step)
+                self.redo_stack.clear()
+
+    def assign(self, mapping: dict, key, value, on_change=None,
+               refresh=None):
+        """
+        Set a dict item and record the change.
+
+        :param mapping: dict, changed dictionary.
+        :param key: key of the changed item.
+        :param value: new value of the item.
+        :param on_change: callable, called after the item changed, also on
+            undo and redo.
+        :param refresh: callable, redraws the window after undo or redo.
+        """
+        self.record(mapping, key, mapping.get(key, self.Missing), value,
+                    on_change, refresh)
+
+    def delete(self, mapping: dict, key, on_change=None, refresh=None):
+        """
+        Delete a dict item and record the change.
+
+        :param mapping: dict, changed dictionary.
+        :param key: key of the deleted item.
+        :param on_change: callable, called after the item changed, also on
+            undo and redo.
+        :param refresh: callable, redraws the window after undo or redo.
+        """
+        self.record(mapping, key, mapping[key], self.Missing, on_change,
+                    refresh)
+
+    def record(self, mapping, key, old, new, on_change, refresh):
+        with self.transaction(refresh):
+            self.step[0].append((mapping, key, old, new, on_change))
+            self.apply(mapping, key, new, on_change)
+
+    def undo(self):
+        """
+        Revert the last undo-step.
+
+        :return: callable refreshing the window, or False if nothing to undo.
+        """
+        if not self.undo_stack:
+            return False
+        records, refresh = self.undo_stack.pop()
+        for mapping, key, old, new, on_change in reversed(records):
+            self.apply(mapping, key, old, on_change)
+        self.redo_stack.append((records, refresh))
+        return refresh
+
+    def redo(self):
+        """
+        Repeat the last reverted undo-step.
+
+        :return: callable refreshing the window, or False if nothing to redo.
+        """
+        if not self.redo_stack:
+            return False
+        records, refresh = self.redo_stack.pop()
+        for mapping, key, old, new, on_change in records:
+            self.apply(mapping, key, new, on_change)
+        self.undo_stack.append((records, refresh))
+        return refresh
+
+    def apply(self, mapping, key, value, on_change):
+        if value is self.Missing:
+            mapping.pop(key, None)
+        else:
+            mapping[key] = value
+        if on_change is not None:
+            on_change()
+
+
+class Validator:
+    """
+    Validation state of all Persons, kept up to date incrementally: each
+    change of a Statistic or Skill re-checks only this entry and the Skills
+    linked to it, so roster badges and warnings are read in O(1).
+    """
+
+    StatisticRange = (8, 20)
+    SkillRange = (0, 8)
+
+    def __init__(self, required: int):
+        """
+        Creates a new validator.
+
+        :param required: int, how many Statistics a Person needs to be set.
+        """
+        self.required = required
+        self.filled = {}
+        self.issues = {}
+
+    def check(self, person: Person, statistic: str = None):
+        """
+        Update the validation state after a Person or one of it's entries
+        changed.
+
+        :param person: an instance of the Person class.
+        :param statistic: str, name of the changed Statistic or Skill, None if
+            the whole Person should be checked.
+        """
+        if statistic is None:
+            self.filled[person.name] = set()
+            self.issues[person.name] = {}
+            for name in person.statistics:
+                self.check_entry(person, name)
+        else:
+            self.check_entry(person, statistic)
+            for skill in person.dependent_skills(statistic):
+                self.check_entry(person, skill)
+
+    def check_entry(self, person: Person, name: str):
+        filled = self.filled.setdefault(person.name, set())
+        issues = self.issues.setdefault(person.name, {})
+        filled.discard(name)
+        issues.pop(name, None)
+        entry = person.statistics.get(name)
+
+        if isinstance(entry, Statistic):
+            low, high = self.StatisticRange
+            if entry.value > 0:
+                filled.add(name)
+                if not low <= entry.value <= high:
+                    issues[name] = "{0}: {1} poza zakresem {2}-{3}".format(
+                        name, entry.value, low, high)
+        elif isinstance(entry, Skill):
+            low, high = self.SkillRange
+            if not low <= entry.value <= high:
+                issues[name] = "{0}: {1} poza zakresem {2}-{3}".format(
+                    name, entry.value, low, high)
+            elif entry.statistic is None:
+                issues[name] = "{0}: brak przypisanej Cechy".format(name)
+            elif not isinstance(person.statistics.get(entry.statistic),
+                                Statistic):
+                issues[name] = "{0}: brak Cechy {1}".format(name,
+                                                          entry.statistic)
+
+    def forget(self, name: str):
+        """
+        Drop the validation state of a deleted Person.
+
+        :param name: str, name of the Person.
+        """
+        self.filled.pop(name, None)
+        self.issues.pop(name, None)
+
+    def is_complete(self, name: str):
+        """Check if a Person has all required Statistics set."""
+        return len(self.filled.get(name, ())) >= self.required
+
+    def badge(self, name: str):
+        """
+        Get a roster badge of a Person.
+
+        :param name: str, name of the Person.
+        :return: tuple, (text, color) of the badge.
+        """
+        if not self.is_complete(name):
+            return "X", "red"
+        if self.issues.get(name):
+            return "!", "orange"
+        return "OK", "green"
+
+
+class DifficultyTable:
+    """
+    Precomputed difficulty of 3d20 tests: the modifier subtracted from tested
+    value for every combination of test difficulty, Tricks sliders, Skill
+    points and critical results (ones and twenties) on the dice. Values out of
+    the table are clamped to it's bounds.
+    """
+
+    Modifiers = {-5: -15, -4: -11, -3: -8, -2: -5, -1: -2, 0: 0, 1: 2, 2: 5,
+                 3: 8, 4: 11, 5: 15, 6: 20, 7: 24}
+    Difficulties = (-2, 7)
+    Sliders = (0, 4)
+    SkillPoints = (0, 8)
+
+    def __init__(self):
+        """Creates a new table and computes all it's values."""
+        self.values = []
+        for difficulty in range(self.Difficulties[0], self.Difficulties[1] + 1):
+            for sliders in range(self.Sliders[0], self.Sliders[1] + 1):
+                for points in range(self.SkillPoints[0], self.SkillPoints[1] + 1):
+                    base = self.convert(difficulty - sliders - int(points / 4))
+                    for ones in range(0, 4):
+                        for twenties in range(0, 4):
+                            self.values.append(base - 3 * ones + 3 * twenties)
+
+    @classmethod
+    def convert(cls, slider_value: int):
+        """
+        Convert sliders/test difficulty to the actual modifier.
+
+        :param slider_value: int, number of sliders.
+        :return: int, modifier to the test.
+        """
+        return cls.Modifiers[min(max(slider_value, -5), 7)]
+
+    def row(self, difficulty: int, sliders: int = 0, skill_points: int = 0):
+        """
+        Get the offset of modifiers of one test, indexed with 4 * ones +
+        twenties rolled on the dice.
+
+        :param difficulty: int, difficulty level of the test (-2 to 7).
+        :param sliders: int, sliders provided by Tricks.
+        :param skill_points: int, points of the tested Skill.
+        :return: int, offset of the row in self.values.
+        """
+        difficulty = min(max(difficulty, self.Difficulties[0]),
+                         self.Difficulties[1]) - self.Difficulties[0]
+        sliders = min(max(sliders, self.Sliders[0]), self.Sliders[1])
+        skill_points = min(max(skill_points, self.SkillPoints[0]),
+                           self.SkillPoints[1])
+        return ((difficulty * (self.Sliders[1] + 1) + sliders) *
+                (self.SkillPoints[1] + 1) + skill_points) * 16
+
+    def modifier(self, difficulty: int, sliders: int, skill_points: int,
+                 ones: int, twenties: int):
+        """
+        Get the modifier of a test.
+
+        :param difficulty: int, difficulty level of the test (-2 to 7).
+        :param sliders: int, sliders provided by Tricks.
+        :param skill_points: int, points of the tested Skill.
+        :param ones: int, number of ones rolled.
+        :param twenties: int, number of twenties rolled.
+        :return: int, modifier subtracted from the tested value.
+        """
+        return self.values[self.row(difficulty, sliders, skill_points) +
+                           4 * ones + twenties]
+
+
+class RollHistory:
+    """
+    Columnar log of all resolved tests. Every column is a compact typed array
+    and names of Persons and Statistics are stored as codes, so aggregations
+    over millions of rolls run on whole columns at once.
+    """
+
+    Columns = {"times": "d", "persons": "I", "statistics": "I",
+               "difficulties": "b", "first": "B", "second": "B", "third": "B",
+               "passed": "B", "points": "h", "tested": "h"}
+
+    def __init__(self):
+        """Creates a new, empty history of rolls."""
+        self.names = []
+        self.codes = {}
+        for column in self.Columns:
+            setattr(self, column, array(self.Columns[column]))
+
+    def __len__(self):
+        return len(self.times)
+
+    def code(self, name: str):
+        if name not in self.codes:
+            self.codes[name] = len(self.names)
+            self.names.append(name)
+        return self.codes[name]
+
+    def append(self, person: str, statistic: str, difficulty: int,
+               result: list):
+        """
+        Log one resolved test.
+
+        :param person: str, name of the tested Person.
+        :param statistic: str, name of the tested Statistic or Skill.
+        :param difficulty: int, difficulty level of the test.
+        :param result: list, result of the test returned by resolve_test.
+        """
+        self.times.append(time.time())
+        self.persons.append(self.code(person))
+        self.statistics.append(self.code(statistic))
+        self.difficulties.append(difficulty)
+        self.first.append(result[1][0])
+        self.second.append(result[1][1])
+        self.third.append(result[1][2])
+        self.passed.append(result[0])
+        self.points.append(result[3])
+        self.tested.append(result[4])
+
+    def pass_rates(self, column: str, start: int = 0):
+        """
+        Count passed and all tests grouped by Persons or Statistics.
+
+        :param column: str, "persons" or "statistics".
+        :param start: int, index of the first counted roll.
+        :return: dict, name -> (passed, total) tuple.
+        """
+        codes = getattr(self, column)[start:]
+        totals = Counter(codes)
+        passed = Counter(compress(codes, self.passed[start:]))
+        return {self.names[code]: (passed[code], totals[code])
+                for code in totals}
+
+    def face_counts(self, start: int = 0):
+        """
+        Count how many times each face of d20 was rolled.
+
+        :param start: int, index of the first counted roll.
+        :return: list, 20 counts of faces 1-20.
+        """
+        counts = Counter(self.first[start:])
+        counts.update(self.second[start:])
+        counts.update(self.third[start:])
+        return [counts[face] for face in range(1, 21)]
+
+    def extend(self, other, start: int = 0):
+        """
+        Append rolls logged in another history.
+
+        :param other: an instance of the RollHistory class.
+        :param start: int, index of the first appended roll of other.
+        """
+        for column in self.Columns:
+            if column in ("persons", "statistics"):
+                getattr(self, column).extend(
+                    self.code(other.names[code])
+                    for code in getattr(other, column)[start:])
+            else:
+                getattr(self, column).extend(getattr(other, column)[start:])
+
+    def hardest(self, count: int = 10, start: int = 0):
+        """
+        Find tests with the lowest tested value.
+
+        :param count: int, number of tests to find.
+        :param start: int, index of the first searched roll.
+        :return: list, (person, statistic, difficulty, tested value, passed,
+            points) tuples from the hardest one.
+        """
+        indexes = heapq.nsmallest(count, range(start, len(self)),
+                                  key=self.tested.__getitem__)
+        return [(self.names[self.persons[i]], self.names[self.statistics[i]],
+                 self.difficulties[i], self.tested[i], bool(self.passed[i]),
+                 self.points[i]) for i in indexes]
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of the recent test results of one Person, keyed by
+    (statistic, difficulty).
+    """
+
+    def __init__(self, size: int = 32):
+        """
+        Creates a new, empty cache.
+
+        :param size: int, maximum number of cached results.
+        """
+        self.size = size
+        self.results = OrderedDict()
+        self.latest = {}
+
+    def put(self, statistic: str, difficulty: int, result: list):
+        """
+        Cache a result of the test, evicting the least recently used one.
+
+        :param statistic: str, name of the tested Statistic or Skill.
+        :param difficulty: int, difficulty level of the test.
+        :param result: list, result of the test returned by resolve_test.
+        """
+        self.results[(statistic, difficulty)] = result
+        self.results.move_to_end((statistic, difficulty))
+        self.latest[statistic] = difficulty
+        if len(self.results) > self.size:
+            (evicted, level), _ = self.results.popitem(last=False)
+            if self.latest.get(evicted) == level:
+                del self.latest[evicted]
+                for statistic, difficulty in reversed(self.results):
+                    if statistic == evicted:
+                        self.latest[evicted] = difficulty
+                        break
+
+    def get(self, statistic: str, difficulty: int):
+        """
+        Get a cached result of the test.
+
+        :param statistic: str, name of the tested Statistic or Skill.
+        :param difficulty: int, difficulty level of the test.
+        :return: list, result of the test or None if it is not cached.
+        """
+        result = self.results.get((statistic, difficulty))
+        if result is not None:
+            self.results.move_to_end((statistic, difficulty))
+        return result
+
+    def last(self, statistic: str):
+        """
+        Get the most recent cached result of tests of a Statistic or Skill.
+
+        :param statistic: str, name of the tested Statistic or Skill.
+        :return: list, result of the test or None if nothing is cached.
+        """
+        if statistic not in self.latest:
+            return None
+        return self.results[(statistic, self.latest[statistic])]
+
+
+class Store:
+    """
+    Shelve file with Persons and Locations shared by many application
+    instances on the same machine (eg. GM and co-GM windows). Every record is
+    kept under it's own key, all access is guarded by a lock-file and each
+    write is appended to a change-log, so instances exchange only the records
+    changed by the others.
+
+    Deleted records are overwritten with None tombstones instead of deleting
+    their keys: dbm.dumb rewrites the whole index on every deletion. When the
+    tombstones are half of the file, it is compacted in one pass.
+    """
+
+    LogSize = 1000
+    Kinds = ("person", "location")
+
+    def __init__(self, path: str = "saved_data"):
+        """
+        Creates a new store.
+
+        :param path: str, path of the shelve file.
+        """
+        self.path = path
+        self.revision = 0
+
+    @contextmanager
+    def locked(self):
+        """Hold the exclusive lock of the store inside the with-block."""
+        with open(self.path + ".lock", "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def key(kind: str, name: str):
+        return "{0}:{1}".format(kind, name)
+
+    def load(self):
+        """
+        Load all records, converting the file saved by older versions which
+        kept whole dicts under single keys.
+
+        :return: tuple, (dict of Persons, dict of Locations, RollHistory).
+        """
+        records = {kind: {} for kind in self.Kinds}
+        with self.locked(), shelve.open(self.path) as shelf:
+            if "persons" in shelf and "locations" in shelf:
+                for kind, old_key in (("person", "persons"),
+                                      ("location", "locations")):
+                    for name, record in shelf[old_key].items():
+                        if name != "Type":
+                            shelf[self.key(kind, name)] = record
+                    del shelf[old_key]
+            for key in shelf.keys():
+                kind, _, name = key.partition(":")
+                if kind in records:
+                    record = shelf[key]
+                    if record is not None:
+                        records[kind][name] = record
+            self.revision = shelf.get("revision", 0)
+            roll_history = shelf.get("roll_history", RollHistory())
+        return records["person"], records["location"], roll_history
+
+    def changed_elsewhere(self):
+        """Check cheaply, without locking, if other instance wrote records."""
+        try:
+            with open(self.path + ".rev") as revision_file:
+                return int(revision_file.read()) > self.revision
+        except (OSError, ValueError):
+            return False
+
+    def sync(self, records: dict):
+        """
+        Write records changed by this instance and read ones changed by the
+        other instances since the last sync. Writes are per record, so only
+        simultaneous edits of the same record are won by the last writer.
+
+        :param records: dict, (kind, name) -> record, None for deleted ones.
+        :return: tuple, (dict of (kind, name) -> record or None read from the
+            store, bool if it holds all records because the change-log was
+            too short to follow the changes).
+        """
+        remote = {}
+        with self.locked():
+            with shelve.open(self.path) as shelf:
+                revision = shelf.get("revision", 0)
+                log = shelf.get("log", [])
+                complete = revision > self.revision and \
+                    (not log or log[0][0] > self.revision + 1)
+                if complete:
+                    for key in shelf.keys():
+                        kind, _, name = key.partition(":")
+                        if kind in self.Kinds and (kind, name) not in records:
+                            remote[(kind, name)] = shelf[key]
+                elif revision > self.revision:
+                    for change, kind, name in log:
+                        if change > self.revision and \
+                                (kind, name) not in records:
+                            remote[(kind, name)] = shelf.get(
+                                self.key(kind, name))
+
+                tombstones = shelf.get("tombstones", 0)
+                for kind, name in records:
+                    key = self.key(kind, name)
+                    if records[(kind, name)] is not None:
+                        shelf[key] = records[(kind, name)]
+                    elif key in shelf:
+                        shelf[key] = None
+                        tombstones += 1
+                    revision += 1
+                    log.append((revision, kind, name))
+                if records:
+                    shelf["revision"] = revision
+                    shelf["log"] = log[-self.LogSize:]
+                    shelf["tombstones"] = tombstones
+                    with open(self.path + ".rev.tmp", "w") as revision_file:
+                        revision_file.write(str(revision))
+                    os.replace(self.path + ".rev.tmp", self.path + ".rev")
+                self.revision = revision
+                compact = tombstones * 2 > len(shelf)
+            if compact:
+                self.compact()
+        return remote, complete
+
+    def compact(self):
+        """
+        Rewrite the file without tombstones of deleted records. Pickled values
+        are copied as they are, only the few-bytes ones are checked for None.
+        The lock has to be held by the caller.
+        """
+        temporary = self.path + ".compact"
+        with dbm.open(self.path, "r") as old, dbm.open(temporary, "n") as new:
+            for key in old.keys():
+                value = old[key]
+                if key != b"tombstones" and \
+                        (len(value) > 8 or pickle.loads(value) is not None):
+                    new[key] = value
+        for name in glob.glob(glob.escape(temporary) + "*"):
+            os.replace(name, self.path + name[len(temporary):])
+
+    def save_rolls(self, roll_history: RollHistory, start: int):
+        """
+        Append rolls logged by this instance to the stored history.
+
+        :param roll_history: an instance of the RollHistory class.
+        :param start: int, index of the first roll not saved yet.
+        """
+        with self.locked(), shelve.open(self.path) as shelf:
+            stored = shelf.get("roll_history", RollHistory())
+            stored.extend(roll_history, start)
+            shelf["roll_history"] = stored
+
+
+class CommandIndex:
+    """
+    Precompiled index of the command palette actions. Labels are folded once
+    and searched with a single compiled fuzzy regex per keystroke, and names
+    of Persons are kept sorted for prefix lookups of multi-part commands. All
+    matching labels are ranked by match compactness, frequency and recency of
+    use.
+
+    Every keystroke is answered without scanning all labels: labels are
+    checked in order of the first position of the query's first character,
+    which bounds the rank of their matches, until no unchecked label could
+    enter the results. Labels left by the last query are kept, so a query
+    extended by the next keystroke is checked only against them. Frecency
+    is added only to the best matches and to the used labels.
+    """
+
+    ChunkSize = 1000
+
+    def __init__(self):
+        """Creates a new, empty index."""
+        self.entries = []
+        self.labels = []
+        self.lines = {}
+        self.query = None
+        self.candidates = []
+        self.first = None
+        self.person_keys = []
+        self.person_names = {}
+        self.uses = {}
+
+    def rebuild(self, entries: list, persons):
+        """
+        Replace all indexed actions.
+
+        :param entries: list, (label, action) tuples, action is a callable or
+            None for entries which only complete the typed command.
+        :param persons: iterable of str names of Persons.
+        """
+        self.entries = entries
+        self.labels = [fold(label) for label, _ in entries]
+        self.query = None
+        self.candidates = []
+        self.first = None
+        self.lines = {label: i for i, (label, _) in enumerate(entries)}
+        self.person_names = {fold(name): name for name in persons}
+        self.person_keys = sorted(self.person_names)
+
+    def search(self, query: str, limit: int = 10):
+        """
+        Find actions fuzzy-matching the query: all it's characters have to
+        appear in the label in the same order.
+
+        :param query: str, typed query.
+        :param limit: int, maximum number of results.
+        :return: list of (label, action) tuples from the best one.
+        """
+        query = fold(query).strip()
+        if not query:
+            best = [self.lines[label] for label in sorted(
+                (label for label in self.uses if label in self.lines),
+                key=lambda label: -self.frecency(label))][:limit]
+            for i in range(0, len(self.entries)):
+                if len(best) >= limit:
+                    break
+                if i not in best:
+                    best.append(i)
+            return [self.entries[i] for i in best]
+        pattern = regex.compile(regex.escape(query[0]) + "".join(
+            "[^{0}]*{0}".format(regex.escape(character))
+            for character in query[1:]))
+        positions, ordered = self.first_positions(query[0])
+        if self.query is not None and query.startswith(self.query):
+            candidates = self.candidates
+        else:
+            candidates = ordered
+        matches = []
+        best = []
+        checked = 0
+        while checked < len(candidates):
+            following = candidates[checked]
+            if len(best) >= limit and best[-1] < (
+                    len(query) + positions[following] / 10, following):
+                break
+            chunk = candidates[checked:checked + self.ChunkSize]
+            found = [(self.rank(match), i) for i, match in zip(
+                chunk, map(pattern.search, [self.labels[i] for i in chunk]))
+                if match is not None]
+            matches.extend(i for _, i in found)
+            best = heapq.nsmallest(limit, best + found)
+            checked += len(chunk)
+        self.query = query
+        self.candidates = matches + candidates[checked:]
+
+        best = [i for _, i in best]
+        best.extend(self.lines[label] for label in self.uses
+                    if label in self.lines)
+        scores = {}
+        for i in sorted(set(best)):
+            match = pattern.search(self.labels[i])
+            if match is not None:
+                scores[i] = self.rank(match) - self.frecency(
+                    self.entries[i][0])
+        best = heapq.nsmallest(limit, scores, key=scores.__getitem__)
+        return [self.entries[i] for i in best]
+
+    def first_positions(self, character: str):
+        """
+        Find the first position of a character in every label. Results for
+        the last character are kept until the index is rebuilt.
+
+        :param character: str, folded character.
+        :return: tuple, (list of positions, -1 where missing, list of indexes
+            of labels with the character sorted by it's position).
+        """
+        if self.first is None or self.first[0] != character:
+            positions = list(map(str.find, self.labels, repeat(character)))
+            ordered = sorted(compress(range(0, len(positions)),
+                                      map((-1).__lt__, positions)),
+                             key=positions.__getitem__)
+            self.first = (character, positions, ordered)
+        return self.first[1], self.first[2]
+
+    @staticmethod
+    def rank(match):
+        """Rank a match higher the shorter it is and the closer to start."""
+        return match.end() - match.start() + match.start() / 10
+
+    def find_person(self, text: str, limit: int = 10):
+        """
+        Find a Person which name starts the text.
+
+        :param text: str, typed text.
+        :param limit: int, maximum number of completions.
+        :return: tuple, (name of the found Person or None, rest of the text
+            after the name, list of names completing the text).
+        """
+        folded = fold(text).strip()
+        found = None
+        for i in range(0, len(folded) + 1):
+            if (i == len(folded) or folded[i] == " ") and \
+                    folded[:i] in self.person_names:
+                found = folded[:i]
+        completions = []
+        start = bisect_left(self.person_keys, folded)
+        for key in self.person_keys[start:start + limit + 1]:
+            if key.startswith(folded) and key != found:
+                completions.append(self.person_names[key])
+        if found is None:
+            return None, "", completions[:limit]
+        return self.person_names[found], text.strip()[len(found):].strip(), \
+            completions[:limit]
+
+    def used(self, label: str):
+        """Remember that an action was executed."""
+        count, _ = self.uses.get(label, (0, 0))
+        self.uses[label] = (count + 1, time.time())
+
+    def frecency(self, label: str):
+        """Rank an action higher the more often and recently it was used."""
+        if label not in self.uses:
+            return 0
+        count, last = self.uses[label]
+        return min(count, 10) + 10 / (1 + (time.time() - last) / 600)
 
 
 class Application:
     """Actual tkinter window-app."""
 
+    SyncInterval = 2000
+
     def __init__(self, master):
         self.mainframe = master
         self.mainframe.title("Neuroshima Test Simulator")
@@ -181,11 +1542,38 @@ class Application:
         self.show_locations_button = Button(self.main_buttons_frame, text="Miejsca")
         self.show_locations_button.pack(side=LEFT)
 
+        self.undo_button = Button(self.main_buttons_frame, text="Cofnij",
+                                  command=self.undo)
+        self.undo_button.pack(side=LEFT)
+        self.redo_button = Button(self.main_buttons_frame, text="Ponów",
+                                  command=self.redo)
+        self.redo_button.pack(side=LEFT)
+        self.mainframe.bind("<Control-z>", lambda event: self.undo())
+        self.mainframe.bind("<Control-y>", lambda event: self.redo())
+        self.mainframe.bind("<Control-k>", self.show_palette)
+        self.command_index = CommandIndex()
+        self.palette = None
+        self.palette_dirty = True
+
         self.search_entry = self.entry = Entry(self.main_buttons_frame)
         self.search_entry.pack(side=LEFT)
         self.search_entry.bind("<FocusIn>", self.bind_keys)
         self.search_button = Button(self.main_buttons_frame, text="Szukaj",
                                     command=self.find_person).pack(side=LEFT)
+        self.text_search_button = Button(self.main_buttons_frame,
+                                         text="Szukaj w opisach",
+                                         command=self.full_text_search)
+        self.text_search_button.pack(side=LEFT)
+        self.dashboard_button = Button(self.main_buttons_frame,
+                                       text="Statystyki sesji",
+                                       command=self.show_dashboard)
+        self.dashboard_button.pack(side=LEFT)
+        self.export_button = Button(self.main_buttons_frame, text="Eksportuj",
+                                    command=self.export_campaign)
+        self.export_button.pack(side=LEFT)
+        self.import_button = Button(self.main_buttons_frame, text="Importuj",
+                                    command=self.import_campaign)
+        self.import_button.pack(side=LEFT)
 
         self.display_frame = Frame(self.main_window)
         self.display_frame.pack(side=LEFT, expand=YES, fill=BOTH)
@@ -195,14 +1583,40 @@ class Application:
 
         self.required_statistics = 6
 
+        self.store = Store("saved_data")
         self.load()
+        self.session_start = len(self.roll_history)
+        self.saved_rolls = len(self.roll_history)
         self.persons["Type"] = Person
         self.locations["Type"] = Location
+        self.start_session()
+        self.mainframe.after(self.SyncInterval, self.synchronize)
         self.show_persons_button.configure(
             command=partial(self.show_elements, self.persons))
         self.show_locations_button.configure(
             command=partial(self.show_elements, self.locations))
 
+    def start_session(self):
+        """
+        Create an empty undo history and index all loaded Persons and
+        Locations.
+
+        """
+        self.history = History()
+        self.recent_results = {}
+        self.validator = Validator(self.required_statistics)
+        self.dirty = set()
+        self.indexed_tricks = {}
+        self.location_index = LocationIndex(self.locations)
+        self.search_index = SearchIndex()
+        for name in self.locations:
+            if name != "Type":
+                self.location_changed(name)
+        for name in self.persons:
+            if name != "Type":
+                self.person_changed(name)
+        self.dirty.clear()
+
     @staticmethod
     def open_file():
         file = filedialog.askopenfilename()
@@ -222,6 +1636,8 @@ class Application:
             Button(self.display_frame.winfo_children()[-1], text="Nowa postać",
                    bg="wheat", command=self.create_person).pack(side=TOP, fill=X,
                                                                 pady=11)
+            Button(self.display_frame.winfo_children()[-1], text="Generuj NPC",
+                   bg="wheat", command=self.create_npcs).pack(side=TOP, fill=X)
         elif dict_of_elements["Type"] == Location:
             Button(self.display_frame.winfo_children()[-1], text="Nowa lokacja",
                    bg="wheat", command=self.create_location).pack(side=TOP,
@@ -281,12 +1697,8 @@ class Application:
         Button(lf,
                text="Usuń", bg="red",
                command=partial(self.delete_element, self.persons, person)).pack(side=LEFT)
-        if check_required(person):
-            Label(lf, text="OK",
-                  fg="green").pack(side=LEFT)
-        else:
-            Label(lf, text="X",
-                  fg="red").pack(side=LEFT)
+        text, color = self.validator.badge(person.name)
+        Label(lf, text=text, fg=color).pack(side=LEFT)
 
     def display_new_location(self, location: Location):
         """
@@ -300,6 +1712,10 @@ class Application:
 
         Button(lf, text="Pokaż na mapie", bg="grey80",
                command=partial(self.show_on_map, location.address)).pack(side=LEFT)
+        Button(lf, text="W pobliżu", bg="grey80",
+               command=partial(self.show_nearby, location)).pack(side=LEFT)
+        Button(lf, text="Spotkania", bg="grey80",
+               command=partial(self.show_encounters, location)).pack(side=LEFT)
         Button(lf, text="Edytuj", bg="grey80",
                command=partial(self.create_location, location)).pack(side=LEFT)
         Button(lf, text="Usuń", bg="red", command=partial(self.delete_element,
@@ -312,9 +1728,292 @@ class Application:
         :param dict_of_elements: dict, dicitionary to process.
         :param element: an instance of spcified class to be deleted.
         """
-        del dict_of_elements[element.name]
+        if isinstance(element, Location):
+            on_change = partial(self.location_changed, element.name)
+        else:
+            on_change = partial(self.person_changed, element.name)
+        self.history.delete(dict_of_elements, element.name, on_change,
+                            partial(self.show_elements, dict_of_elements))
         self.show_elements(dict_of_elements)
 
+    def undo(self):
+        """Revert the last change and redraw the window."""
+        refresh = self.history.undo()
+        if refresh is False:
+            self.message_label.configure(text="Nic do cofnięcia.", bg="red")
+        elif refresh is not None:
+            refresh()
+
+    def redo(self):
+        """Repeat the last reverted change and redraw the window."""
+        refresh = self.history.redo()
+        if refresh is False:
+            self.message_label.configure(text="Nic do ponowienia.", bg="red")
+        elif refresh is not None:
+            refresh()
+
+    def person_changed(self, name: str, statistic: str = None):
+        """
+        Synchronize indexes after a Person was added, replaced or deleted, or
+        after one of it's Statistics or Skills changed. The Person is read by
+        name, so undo and redo always index the object currently stored.
+
+        :param name: str, name of the changed Person.
+        :param statistic: str, name of the changed Statistic or Skill, None if
+            the whole Person changed.
+        """
+        self.dirty.add(("person", name))
+        person = self.persons.get(name)
+        if statistic is None:
+            self.palette_dirty = True
+        if person is None:
+            self.validator.forget(name)
+            self.recent_results.pop(name, None)
+        else:
+            if statistic is not None:
+                person.statistic_changed(statistic)
+            self.validator.check(person, statistic)
+        if statistic is None:
+            tricks = set(self.indexed_tricks.get(name, ()))
+            if person is not None:
+                tricks.update(person.tricks)
+            for trick in tricks:
+                self.trick_changed(name, trick)
+
+    def location_changed(self, name: str):
+        """
+        Synchronize indexes after a Location was added, edited or deleted.
+
+        :param name: str, name of the changed Location.
+        """
+        self.dirty.add(("location", name))
+        self.palette_dirty = True
+        if name in self.locations:
+            location = self.locations[name]
+            self.location_index.add(location)
+            self.search_index.add(("location", name), "{0} {1}".format(
+                name, location.description or ""))
+        else:
+            self.location_index.remove(name)
+            self.search_index.remove(("location", name))
+
+    def trick_changed(self, name: str, trick: str):
+        """
+        Synchronize indexes after a Trick of a Person was added, edited or
+        deleted.
+
+        :param name: str, name of the Person.
+        :param trick: str, name of the changed Trick.
+        """
+        self.dirty.add(("person", name))
+        person = self.persons.get(name)
+        key = ("trick", name, trick)
+        if person is not None and trick in person.tricks:
+            self.search_index.add(key, "{0} {1}".format(
+                trick, person.tricks[trick].description or ""))
+            self.indexed_tricks.setdefault(name, set()).add(trick)
+        else:
+            self.search_index.remove(key)
+            if trick in self.indexed_tricks.get(name, ()):
+                self.indexed_tricks[name].discard(trick)
+                if not self.indexed_tricks[name]:
+                    del self.indexed_tricks[name]
+
+    def show_palette(self, event=None):
+        """
+        Open the command palette: an entry with the list of fuzzy-matched
+        actions updated on every keystroke.
+
+        :param event: key-press which opened the palette.
+        """
+        if self.palette is not None and self.palette.winfo_exists():
+            self.palette_entry.focus_set()
+            return
+        self.palette = Toplevel(self.mainframe)
+        self.palette.title("Polecenia")
+        self.palette_query = StringVar()
+        self.palette_entry = Entry(self.palette, width=60,
+                                   textvariable=self.palette_query)
+        self.palette_entry.pack(side=TOP, fill=X)
+        self.palette_list = Listbox(self.palette, width=60, height=10)
+        self.palette_list.pack(side=TOP, fill=BOTH, expand=YES)
+        self.palette_actions = []
+
+        self.palette_query.trace_add("write", self.update_palette)
+        self.palette_entry.bind("<Down>", partial(self.move_palette, 1))
+        self.palette_entry.bind("<Up>", partial(self.move_palette, -1))
+        self.palette_entry.bind("<Return>", self.execute_palette)
+        self.palette_entry.bind("<Tab>", self.execute_palette)
+        self.palette_entry.bind("<Escape>",
+                                lambda event: self.palette.destroy())
+        self.palette_list.bind("<Double-Button-1>", self.execute_palette)
+        self.palette_entry.focus_set()
+        self.update_palette()
+
+    def update_palette(self, *args):
+        """Fill the palette list with actions matching the typed query."""
+        if self.palette_dirty:
+            self.rebuild_commands()
+        self.palette_actions = self.palette_suggestions(
+            self.palette_query.get())
+        self.palette_list.delete(0, END)
+        for label, _ in self.palette_actions:
+            self.palette_list.insert(END, label)
+        if self.palette_actions:
+            self.palette_list.selection_set(0)
+
+    def move_palette(self, step: int, event):
+        """Move the selection on the palette list."""
+        selection = self.palette_list.curselection()
+        if not self.palette_actions:
+            return "break"
+        index = (selection[0] if selection else 0) + step
+        index = min(max(index, 0), len(self.palette_actions) - 1)
+        self.palette_list.selection_clear(0, END)
+        self.palette_list.selection_set(index)
+        self.palette_list.see(index)
+        return "break"
+
+    def execute_palette(self, event=None):
+        """
+        Execute the selected palette action, or complete the typed command
+        if the action needs more arguments.
+
+        """
+        selection = self.palette_list.curselection()
+        if not self.palette_actions:
+            return "break"
+        label, action = self.palette_actions[selection[0] if selection else 0]
+        if action is None:
+            self.palette_query.set(label + " ")
+            self.palette_entry.icursor(END)
+        else:
+            self.command_index.used(label)
+            self.palette.destroy()
+            action()
+        return "break"
+
+    def rebuild_commands(self):
+        """Recompute all the palette actions of Persons and Locations."""
+        entries = [("postaci", partial(self.show_elements, self.persons)),
+                   ("miejsca", partial(self.show_elements, self.locations)),
+                   ("nowa postać", self.create_person),
+                   ("nowa lokacja", self.create_location),
+                   ("generuj npc", self.create_npcs),
+                   ("statystyki sesji", self.show_dashboard),
+                   ("cofnij", self.undo), ("ponów", self.redo),
+                   ("eksportuj", self.export_campaign),
+                   ("importuj", self.import_campaign)]
+        persons = [name for name in self.persons if name != "Type"]
+        for name in persons:
+            person = self.persons[name]
+            entries.append(("postać " + name,
+                            partial(self.show_statistics, person)))
+            entries.append(("sztuczki " + name,
+                            partial(self.show_tricks, person)))
+            entries.append(("test " + name, None))
+            entries.append(("edytuj " + name, None))
+        for name in self.locations:
+            if name != "Type":
+                location = self.locations[name]
+                entries.append(("miejsce " + name,
+                                partial(self.show_encounters, location)))
+                entries.append(("mapa " + name,
+                                partial(self.show_on_map, location.address)))
+                entries.append(("w pobliżu " + name,
+                                partial(self.show_nearby, location)))
+        self.command_index.rebuild(entries, persons)
+        self.palette_dirty = False
+
+    def palette_suggestions(self, query: str, limit: int = 10):
+        """
+        Get the palette actions for a query. Commands "test <person>
+        <statistic> <difficulty>" and "edytuj <person> <statistic>" are
+        completed step by step, everything else is fuzzy-matched.
+
+        :param query: str, typed query.
+        :param limit: int, maximum number of suggestions.
+        :return: list of (label, action) tuples.
+        """
+        verb, _, rest = query.strip().partition(" ")
+        if fold(verb) not in ("test", "edytuj") or not rest:
+            return self.command_index.search(query, limit)
+        verb = fold(verb)
+
+        difficulty = 0
+        words = rest.split()
+        if verb == "test" and len(words) > 1 and \
+                regex.fullmatch(r"-?\d", words[-1]) and \
+                -2 <= int(words[-1]) <= 7:
+            difficulty = int(words[-1])
+            rest = " ".join(words[:-1])
+
+        name, remainder, completions = self.command_index.find_person(rest)
+        suggestions = []
+        if name is not None:
+            person = self.persons[name]
+            typed = fold(remainder)
+            for statistic in person.statistics:
+                if not fold(statistic).startswith(typed):
+                    continue
+                if verb == "test":
+                    suggestions.append((
+                        "test {0} {1} {2}".format(name, statistic, difficulty),
+                        partial(self.quick_test, person, statistic,
+                                difficulty)))
+                elif isinstance(person.statistics[statistic], Skill):
+                    suggestions.append(("edytuj {0} {1}".format(name,
+                                                                statistic),
+                                        partial(self.add_new_skill, person,
+                                                statistic)))
+                else:
+                    suggestions.append(("edytuj {0} {1}".format(name,
+                                                                statistic),
+                                        partial(self.add_new_statistic,
+                                                person, statistic)))
+            suggestions.sort(key=lambda suggestion: -self.command_index.
+                             frecency(suggestion[0]))
+        suggestions.extend(("{0} {1}".format(verb, completion), None)
+                           for completion in completions)
+        return suggestions[:limit]
+
+    def show_nearby(self, location: Location, radius: float = 20):
+        """
+        Display all Locations in the radius around a Location along with the
+        distances and travel-times.
+
+        :param location: an instance of the Location class.
+        :param radius: float, radius in kilometers.
+        """
+        if location.coordinates is None:
+            self.message_label.configure(
+                text="Brak współrzędnych w adresie.", bg="red")
+            return
+        self.clear(self.display_frame)
+        Label(self.display_frame,
+              text="W promieniu {0} km od: {1}".format(radius,
+                                                       location.name)).pack()
+
+        for distance, name in self.location_index.within(location.coordinates,
+                                                         radius):
+            if name == location.name:
+                continue
+            lf = LabelFrame(self.display_frame, text=name)
+            lf.pack(side=TOP, fill=X)
+            Label(lf, text="{0:.1f} km".format(distance)).pack(side=LEFT)
+            for mode in ("pieszo", "samochód"):
+                hours = self.location_index.travel_time(location.name, name,
+                                                        mode)
+                Label(lf, text="{0}: {1:.1f} h".format(mode, hours)).pack(
+                    side=LEFT)
+            Button(lf, text="Pokaż na mapie", bg="grey80",
+                   command=partial(self.show_on_map,
+                                   self.locations[name].address)).pack(
+                side=LEFT)
+
+        Button(self.display_frame, text="Powrót", command=partial(
+            self.show_elements, self.locations)).pack(side=TOP)
+
     @staticmethod
     def show_on_map(address: str):
         """
@@ -338,6 +2037,42 @@ class Application:
         else:
             self.message_label.configure(text="Nie znaleziono.", bg="red")
 
+    def full_text_search(self):
+        """
+        Find Locations and Tricks which descriptions match the phrase typed in
+        the search-entry, and display them from the best match.
+
+        """
+        results = self.search_index.search(self.search_entry.get())
+        if not results:
+            self.message_label.configure(text="Nie znaleziono.", bg="red")
+            return
+        self.clear(self.display_frame, self.test_frame)
+        for score, key in results:
+            if key[0] == "location":
+                self.display_new_element(self.locations[key[1]])
+            else:
+                self.display_found_trick(self.persons[key[1]], key[2])
+
+    def display_found_trick(self, person: Person, trick: str):
+        """
+        Add one Trick found by full-text search to the window.
+
+        :param person: an instance of the Person class.
+        :param trick: str, name of the Trick.
+        """
+        if len(self.display_frame.winfo_children()) == 0 or \
+                len(self.display_frame.winfo_children()[-1].winfo_children()) > 15:
+            self.new_row(self.display_frame)
+
+        lf = LabelFrame(self.display_frame.winfo_children()[-1],
+                        text="{0}: {1}".format(person.name, trick))
+        lf.pack()
+        Label(lf, text=person.tricks[trick].description,
+              wraplength=300).pack(side=LEFT)
+        Button(lf, text="Sztuczki i Cechy", bg="grey80",
+               command=partial(self.show_tricks, person)).pack(side=LEFT)
+
     def bind_keys(self, event):
         """
         Bind keyboard-press to the self.autocompletion method.
@@ -386,8 +2121,12 @@ class Application:
         Button(self.display_frame.winfo_children()[-1], text="Dodaj Umiejętność", bg="wheat",
                command=partial(self.add_new_skill, person, None)).pack(side=TOP, fill=X)
 
-        if not check_required(person):
+        issues = self.validator.issues.get(person.name)
+        if not self.validator.is_complete(person.name):
             self.message_label.configure(text="Ustaw wartości Współczynników głównych!", bg="red")
+        elif issues:
+            self.message_label.configure(
+                text="; ".join(issues[name] for name in issues), bg="orange")
 
     def display_statistic(self, person: Person, statistic: Statistic):
         """
@@ -408,7 +2147,9 @@ class Application:
               text=person.statistics[statistic].name).pack(side=LEFT,
                                                            expand=YES,
                                                            fill=X)
-        Label(last_col.winfo_children()[-1], bg="white",
+        issues = self.validator.issues.get(person.name, {})
+        Label(last_col.winfo_children()[-1],
+              bg="orange" if statistic in issues else "white",
               text=person.statistics[statistic].value).pack(side=LEFT,
                                                             expand=YES,
                                                             fill=X)
@@ -437,6 +2178,22 @@ class Application:
                                          statistic)).pack(side=LEFT,
                                                           expand=YES,
                                                           fill=X)
+        result = self.results_of(person).last(statistic)
+        if result is not None:
+            Label(last_col.winfo_children()[-1],
+                  text="{0}{1}".format("+" if result[0] else "-", result[3]),
+                  fg="green" if result[0] else "red").pack(side=LEFT)
+
+    def results_of(self, person: Person):
+        """
+        Get the cache of recent test results of a Person.
+
+        :param person: an instance of the Person class.
+        :return: an instance of the ResultCache class.
+        """
+        if person.name not in self.recent_results:
+            self.recent_results[person.name] = ResultCache()
+        return self.recent_results[person.name]
 
     def show_tricks(self, person: Person):
         """
@@ -488,7 +2245,10 @@ class Application:
         :param person: an instance of the Person class.
         :param statistic: an instanmce of the Statistic class.
         """
-        del person.statistics[statistic]
+        self.history.delete(person.statistics, statistic,
+                            partial(self.person_changed, person.name,
+                                    statistic),
+                            partial(self.show_statistics, person))
         self.show_statistics(person)
 
     def delete_trick(self, person, trick):
@@ -498,7 +2258,9 @@ class Application:
         :param person: an instance of the Person class.
         :param trick: an instance of the Trick class.
         """
-        del person.tricks[trick]
+        self.history.delete(person.tricks, trick,
+                            partial(self.trick_changed, person.name, trick),
+                            partial(self.show_tricks, person))
         self.show_tricks(person)
 
     @staticmethod
@@ -511,18 +2273,6 @@ class Application:
         """
         return randint(1, faces)
 
-    @staticmethod
-    def convert_sliders(slider_value: int):
-        """
-        Convert sliders/test difficulty to the actual modifier.
-
-        :param slider_value: int, number of sliders.
-        :return: int, modifier to the test.
-        """
-        values = {-5: -15, -4: -11, -3: -8, -2: -5, -1: -2, 0: 0, 1: 2, 2: 5,
-                  3: 8, 4: 11, 5: 15, 6: 20, 7: 24}
-        return values[slider_value]
-
     def run_test(self, person: Person, statistic: Statistic or Skill):
         """
         Simulate a 3d20 test of a particular Skill or Statistic.
@@ -537,133 +2287,36 @@ class Application:
                      4: "Cholernie trudny", 5: "Farciarski", 6: "Mistrzowski",
                      7: "Arcymistrzowski"}
             self.diff_name.configure(text=names[self.diff_scale.get()])
+            if isinstance(statistic, Skill):
+                chance = test_probability(person.linked_value(statistic.name),
+                                          self.diff_scale.get(), slider,
+                                          statistic.value)
+            else:
+                chance = test_probability(statistic.value,
+                                          self.diff_scale.get())
+            self.chance_label.configure(text="Szansa: {0:.0%}".format(chance))
+
+            cached = self.results_of(person).get(statistic.name,
+                                                 self.diff_scale.get())
+            if cached is not None:
+                self.display_result(cached, previous=True)
+            else:
+                self.clear(self.test_frame)
 
         def apply_tricks():
+            nonlocal slider
+            slider = self.trick_slider(person, statistic.name)
             for trick in person.tricks:
-                if person.tricks[trick].statistic == statistic:
+                if person.tricks[trick].statistic == statistic.name:
                     Label(self.trick_frame, text=person.tricks[trick].name).pack(side=TOP)
-                    if person.tricks[trick].slider > slider:
-                        slider = person.tricks[trick].slider
-                    if person.tricks[trick].modifier > modifier:
-                        modifier = person.tricks[trick].modifier
-
-        def display_result(result):
-            self.clear(self.test_frame)
-
-            txt = "ZDANY" if result[0] else "PORAŻKA"
-            color = "green" if result[0] else "red"
-
-            Label(self.test_frame, text=txt, bg=color, font=20)
-            self.test_frame.winfo_children()[-1].pack(side=TOP, expand=YES,
-                                                      fill=BOTH)
-
-            LabelFrame(self.test_frame, text="Trudność testu:")
-            self.test_frame.winfo_children()[-1].pack(side=TOP, expand=YES,
-                                                      fill=BOTH)
-            Label(self.test_frame.winfo_children()[-1],
-                  text=result[4]).pack(side=LEFT, expand=YES, fill=BOTH)
-
-            LabelFrame(self.test_frame, text="Wyniki na kościach:")
-            self.test_frame.winfo_children()[-1].pack(side=TOP)
-            Label(self.test_frame.winfo_children()[-1],
-                  text=result[1][0]).pack(side=LEFT, expand=YES, fill=BOTH)
-            Label(self.test_frame.winfo_children()[-1],
-                  text=result[1][1]).pack(side=LEFT, expand=YES, fill=BOTH)
-            Label(self.test_frame.winfo_children()[-1],
-                  text=result[1][2]).pack(side=LEFT, expand=YES, fill=BOTH)
-
-            if len(result) == 6:
-                LabelFrame(self.test_frame, text="Dwie najlepsze kości:")
-                self.test_frame.winfo_children()[-1].pack(side=TOP, fill=BOTH)
-                Label(self.test_frame.winfo_children()[-1],
-                      text=result[5][0]).pack(side=LEFT, expand=YES, fill=BOTH)
-                Label(self.test_frame.winfo_children()[-1],
-                      text=result[5][1]).pack(side=LEFT, expand=YES, fill=BOTH)
-
-            LabelFrame(self.test_frame, text="Po odjęciu Umiejętności:")
-            self.test_frame.winfo_children()[-1].pack(side=TOP, fill=BOTH)
-            Label(self.test_frame.winfo_children()[-1],
-                  text=result[2][0]).pack(side=LEFT, expand=YES, fill=BOTH)
-            Label(self.test_frame.winfo_children()[-1],
-                  text=result[2][1]).pack(side=LEFT, expand=YES, fill=BOTH)
-
-            LabelFrame(self.test_frame, text="Punkty sukcesu/porażki:")
-            self.test_frame.winfo_children()[-1].pack(side=TOP, expand=YES,
-                                                      fill=BOTH)
-            Label(self.test_frame.winfo_children()[-1], text=str(result[3]),
-                  bg=color, font=20).pack(side=LEFT, expand=YES, fill=BOTH)
 
         def roll_for_skill(skill: Skill):
-
-            skill_points = skill.value
-            sliders = (slider + int(skill_points / 4))
-
-            base_difficulty = int(self.diff_scale.get()) - sliders
-            real_difficulty = self.convert_sliders(base_difficulty)
-
-            roll_result = []
-
-            for i in range(0, 3):
-                roll_result.append(self.dice_roll(20))
-            original_roll_result = roll_result.copy()
-
-            for result in roll_result:
-                if result == 1:
-                    real_difficulty -= 3
-                elif result == 20:
-                    real_difficulty += 3
-            tested_value = skill.statistic - real_difficulty
-
-            worst_result = max(roll_result)
-            roll_result.remove(worst_result)
-            unmodified = roll_result.copy()
-
-            while skill_points > 0:
-                skill_points -= 1
-                for i in range(0, 2):
-                    if roll_result[i] == max(roll_result) and roll_result[i] > 1:
-                        roll_result[i] -= 1
-                        break
-
-            if max(roll_result) > tested_value:
-                fail_points = max(roll_result) - tested_value
-                display_result([False, original_roll_result, roll_result,
-                                fail_points, tested_value, unmodified])
-            else:
-                succes_points = abs(max(roll_result) - tested_value)
-                display_result([True, original_roll_result, roll_result,
-                                succes_points, tested_value, unmodified])
+            self.display_result(self.perform_test(
+                person, skill, int(self.diff_scale.get()), slider))
 
         def roll_for_statistic(stat: Statistic):
-
-            difficulty = int(self.diff_scale.get())
-            real_difficulty = self.convert_sliders(difficulty)
-            roll_result = []
-
-            for i in range(0, 3):
-                roll_result.append(self.dice_roll(20))
-            original_roll_result = roll_result.copy()
-
-            for result in roll_result:
-                if result == 1:
-                    real_difficulty -= 3
-                elif result == 20:
-                    real_difficulty += 3
-            tested_value = stat.value - real_difficulty
-
-            worst_result = max(roll_result)
-            roll_result.remove(worst_result)
-
-            for result in roll_result:
-                if result > tested_value:
-                    fail_points = max(roll_result) - tested_value
-                    display_result([False, original_roll_result, roll_result,
-                                    fail_points, tested_value])
-                    return
-                else:
-                    succes_points = abs(max(roll_result) - tested_value)
-                    display_result([True, original_roll_result, roll_result,
-                                    succes_points, tested_value])
+            self.display_result(self.perform_test(
+                person, stat, int(self.diff_scale.get())))
 
         self.clear(self.display_frame)
         Label(self.display_frame,
@@ -679,13 +2332,15 @@ class Application:
         self.diff_scale.pack()
         self.diff_name = Label(self.difficulty, text="Przeciętny")
         self.diff_name.pack()
+        self.chance_label = Label(self.difficulty)
+        self.chance_label.pack()
 
         self.trick_frame = LabelFrame(self.display_frame, text="Sztuczki:")
         self.trick_frame.pack(side=TOP)
 
         slider = 0
-        modifier = 0
         apply_tricks()
+        difficulty_text(None)
 
         if isinstance(statistic, Skill):
             Button(self.display_frame, text="Rzuć!",
@@ -697,6 +2352,174 @@ class Application:
         Button(self.display_frame, text="Powrót", command=partial(
             self.show_statistics, person)).pack(side=TOP)
 
+    @staticmethod
+    def trick_slider(person: Person, statistic: str):
+        """
+        Get the best slider provided by Person's Tricks to the tests of a
+        Statistic or Skill.
+
+        :param person: an instance of the Person class.
+        :param statistic: str, name of the tested Statistic or Skill.
+        :return: int, number of sliders.
+        """
+        slider = 0
+        for trick in person.tricks:
+            if person.tricks[trick].statistic == statistic and \
+                    person.tricks[trick].slider > slider:
+                slider = person.tricks[trick].slider
+        return slider
+
+    def perform_test(self, person: Person, statistic: Statistic or Skill,
+                     difficulty: int, slider: int = 0):
+        """
+        Roll 3d20 for a test, log it to the roll history and cache it as the
+        Person's recent result.
+
+        :param person: an instance of the Person class.
+        :param statistic: an instance of the Statistic or Skill class.
+        :param difficulty: int, difficulty level of the test.
+        :param slider: int, sliders provided by Tricks (Skill tests only).
+        :return: list, result of the test returned by resolve_test.
+        """
+        dice = [self.dice_roll(20) for _ in range(0, 3)]
+        if isinstance(statistic, Skill):
+            result = resolve_test(dice, person.linked_value(statistic.name),
+                                  difficulty, slider, statistic.value)
+        else:
+            result = resolve_test(dice, statistic.value, difficulty)
+        self.roll_history.append(person.name, statistic.name, difficulty,
+                                 result)
+        self.results_of(person).put(statistic.name, difficulty, result)
+        return result
+
+    def quick_test(self, person: Person, statistic: str, difficulty: int):
+        """
+        Run a test straight from the command palette, displaying only it's
+        result.
+
+        :param person: an instance of the Person class.
+        :param statistic: str, name of the tested Statistic or Skill.
+        :param difficulty: int, difficulty level of the test.
+        """
+        result = self.perform_test(person, person.statistics[statistic],
+                                   difficulty,
+                                   self.trick_slider(person, statistic))
+        self.display_result(result)
+        self.message_label.configure(
+            text="{0} - {1}, trudność {2}".format(person.name, statistic,
+                                                  difficulty))
+
+    def display_result(self, result: list, previous: bool = False):
+        """
+        Display a result of the test in the test-frame.
+
+        :param result: list, result of the test returned by resolve_test.
+        :param previous: bool, if the result comes from an earlier roll.
+        """
+        self.clear(self.test_frame)
+
+        if previous:
+            Label(self.test_frame, text="Poprzedni wynik").pack(side=TOP)
+
+        txt = "ZDANY" if result[0] else "PORAŻKA"
+        color = "green" if result[0] else "red"
+
+        Label(self.test_frame, text=txt, bg=color, font=20)
+        self.test_frame.winfo_children()[-1].pack(side=TOP, expand=YES,
+                                                  fill=BOTH)
+
+        LabelFrame(self.test_frame, text="Trudność testu:")
+        self.test_frame.winfo_children()[-1].pack(side=TOP, expand=YES,
+                                                  fill=BOTH)
+        Label(self.test_frame.winfo_children()[-1],
+              text=result[4]).pack(side=LEFT, expand=YES, fill=BOTH)
+
+        LabelFrame(self.test_frame, text="Wyniki na kościach:")
+        self.test_frame.winfo_children()[-1].pack(side=TOP)
+        Label(self.test_frame.winfo_children()[-1],
+              text=result[1][0]).pack(side=LEFT, expand=YES, fill=BOTH)
+        Label(self.test_frame.winfo_children()[-1],
+              text=result[1][1]).pack(side=LEFT, expand=YES, fill=BOTH)
+        Label(self.test_frame.winfo_children()[-1],
+              text=result[1][2]).pack(side=LEFT, expand=YES, fill=BOTH)
+
+        if len(result) == 6:
+            LabelFrame(self.test_frame, text="Dwie najlepsze kości:")
+            self.test_frame.winfo_children()[-1].pack(side=TOP, fill=BOTH)
+            Label(self.test_frame.winfo_children()[-1],
+                  text=result[5][0]).pack(side=LEFT, expand=YES, fill=BOTH)
+            Label(self.test_frame.winfo_children()[-1],
+                  text=result[5][1]).pack(side=LEFT, expand=YES, fill=BOTH)
+
+        LabelFrame(self.test_frame, text="Po odjęciu Umiejętności:")
+        self.test_frame.winfo_children()[-1].pack(side=TOP, fill=BOTH)
+        Label(self.test_frame.winfo_children()[-1],
+              text=result[2][0]).pack(side=LEFT, expand=YES, fill=BOTH)
+        Label(self.test_frame.winfo_children()[-1],
+              text=result[2][1]).pack(side=LEFT, expand=YES, fill=BOTH)
+
+        LabelFrame(self.test_frame, text="Punkty sukcesu/porażki:")
+        self.test_frame.winfo_children()[-1].pack(side=TOP, expand=YES,
+                                                  fill=BOTH)
+        Label(self.test_frame.winfo_children()[-1], text=str(result[3]),
+              bg=color, font=20).pack(side=LEFT, expand=YES, fill=BOTH)
+
+    def show_dashboard(self, start: int = None):
+        """
+        Display statistics of logged tests: pass-rates of Persons and Skills,
+        counts of dice-faces and the hardest tests.
+
+        :param start: int, index of the first roll taken into account, by
+            default the first roll of the current session.
+        """
+        start = self.session_start if start is None else start
+        self.clear(self.display_frame, self.test_frame)
+
+        Frame(self.display_frame).pack(side=TOP, fill=X)
+        Label(self.display_frame.winfo_children()[-1],
+              text="Testy: {0}".format(len(self.roll_history) - start)).pack(
+            side=LEFT)
+        Button(self.display_frame.winfo_children()[-1], text="Ta sesja",
+               command=partial(self.show_dashboard, None)).pack(side=LEFT)
+        Button(self.display_frame.winfo_children()[-1], text="Cała historia",
+               command=partial(self.show_dashboard, 0)).pack(side=LEFT)
+
+        for column, title in (("persons", "Zdawalność postaci:"),
+                              ("statistics", "Zdawalność współczynników:")):
+            rates = self.roll_history.pass_rates(column, start)
+            lf = LabelFrame(self.display_frame, text=title)
+            lf.pack(side=LEFT, fill=Y)
+            for name in sorted(rates, key=lambda key: -rates[key][1])[:20]:
+                passed, total = rates[name]
+                Label(lf, text="{0}: {1}/{2} ({3:.0%})".format(
+                    name, passed, total, passed / total)).pack(side=TOP,
+                                                              anchor=W)
+
+        faces = self.roll_history.face_counts(start)
+        lf = LabelFrame(self.test_frame, text="Wyniki na kościach:")
+        lf.pack(side=TOP, fill=X)
+        for face in range(0, 20):
+            Label(lf, text="{0}: {1}".format(face + 1, faces[face])).grid(
+                row=face % 10, column=face // 10, sticky=W)
+        expected = sum(faces) / 20
+        if expected > 0:
+            chi_square = sum((count - expected) ** 2 / expected
+                             for count in faces)
+            suspicious = chi_square > 36.19
+            Label(lf, text="Chi²: {0:.1f}".format(chi_square),
+                  fg="red" if suspicious else "green").grid(row=10, column=0,
+                                                            columnspan=2)
+
+        lf = LabelFrame(self.test_frame, text="Najtrudniejsze testy:")
+        lf.pack(side=TOP, fill=X)
+        for person, statistic, difficulty, tested, passed, points in \
+                self.roll_history.hardest(10, start):
+            Label(lf, text="{0} - {1}: trudność {2}, testowano {3}, {4} "
+                           "({5})".format(person, statistic, difficulty,
+                                          tested,
+                                          "ZDANY" if passed else "PORAŻKA",
+                                          points)).pack(side=TOP, anchor=W)
+
     def add_new_skill(self, person: Person, skill_name: str):
         """
         Register new Skill to the Person's dict and display new list of this
@@ -711,11 +2534,15 @@ class Application:
             value = int(self.entry2.get())
             sliders = int(self.entry4.get())
             if self.entry3.get() != "":
-                statistic = person.statistics[self.entry3.get()].value
+                statistic = self.entry3.get()
             else:
-                statistic = person.statistics[Skill.Statistics[name.title()]].value
+                statistic = Skill.default_statistic(name)
 
-            person.statistics[name] = Skill(name, value, sliders, statistic)
+            self.history.assign(person.statistics, name,
+                                Skill(name, value, sliders, statistic),
+                                partial(self.person_changed, person.name,
+                                        name),
+                                partial(self.show_statistics, person))
 
             self.show_statistics(person)
 
@@ -760,7 +2587,11 @@ class Application:
             name = stat_name if stat_name is not None else self.entry.get()
             value = int(self.entry2.get())
 
-            person.statistics[name] = Statistic(name, value)
+            self.history.assign(person.statistics, name,
+                                Statistic(name, value),
+                                partial(self.person_changed, person.name,
+                                        name),
+                                partial(self.show_statistics, person))
 
             self.show_statistics(person)
 
@@ -799,12 +2630,14 @@ class Application:
             description = self.work_entry.get()
             stat_name = self.stat_entry.get()
             slider = self.scale.get()
-            modifier = self.mod_entry.get()
-            repeat = self.reroll_box.getboolean(repeat_roll)
-            mod = 0
-            person.tricks[trick_name] = Trick(trick_name, description,
-                                              stat_name, slider, repeat,
-                                              modifier)
+            modifier = int(self.mod_entry.get() or 0)
+            repeat = self.reroll_var.get()
+            self.history.assign(person.tricks, trick_name,
+                                Trick(trick_name, description, stat_name,
+                                      slider, repeat, modifier),
+                                partial(self.trick_changed, person.name,
+                                        trick_name),
+                                partial(self.show_tricks, person))
             self.show_statistics(person)
 
         name = "" if trick_name is None else person.tricks[trick_name].name
@@ -829,16 +2662,15 @@ class Application:
 
         LabelFrame(self.display_frame, text="Ułatwia test?:")
         self.display_frame.winfo_children()[-1].pack()
-        self.mod_entry = Entry(self.display_frame.winfo_children()[-1],
-                               variable=repeat_roll)
+        self.mod_entry = Entry(self.display_frame.winfo_children()[-1])
         self.mod_entry.insert(END, modifier)
-        self.reroll_box.pack(side=LEFT)
+        self.mod_entry.pack(side=LEFT)
 
         LabelFrame(self.display_frame, text="Zapewnia przerzut?:")
         self.display_frame.winfo_children()[-1].pack()
+        self.reroll_var = BooleanVar(value=repeat_roll)
         self.reroll_box = Checkbutton(self.display_frame.winfo_children()[-1],
-                                      variable=repeat_roll)
-        self.reroll_box.getboolean(repeat_roll)
+                                      variable=self.reroll_var)
         self.reroll_box.pack(side=LEFT)
 
         LabelFrame(self.display_frame, text="Zapewnia Suwak?:")
@@ -881,18 +2713,227 @@ class Application:
         """
         name = self.name_entry.get()
         if name != "":
-            self.persons[name] = Person(name)
+            person = Person(name)
 
             for statistic in Statistic.Statistics:
-                self.persons[name].set_statistic(statistic, 0)
+                person.set_statistic(statistic, 0)
 
             for skill in Skill.Statistics:
-                self.persons[name].set_skill(skill, 0, 0)
+                person.set_skill(skill, 0, 0)
 
-            self.show_statistics(self.persons[name])
+            self.set_person(person)
+            self.show_statistics(person)
         else:
             self.message_label.configure(text="Wpisz imię!", bg="red")
 
+    def set_person(self, person: Person):
+        """
+        Put a Person into the self.persons dict as one undo-step, replacing
+        the Person with the same name.
+
+        :param person: an instance of the Person class.
+        """
+        self.history.assign(self.persons, person.name, person,
+                            partial(self.person_changed, person.name),
+                            partial(self.show_elements, self.persons))
+
+    def create_npcs(self):
+        """
+        Display form for generating a batch of NPCs of chosen archetype.
+
+        """
+        self.clear(self.display_frame)
+
+        LabelFrame(self.display_frame, text="Archetyp:")
+        self.display_frame.winfo_children()[-1].pack()
+        archetypes = list(Archetype.Archetypes)
+        self.archetype_var = StringVar(value=archetypes[0])
+        OptionMenu(self.display_frame.winfo_children()[-1], self.archetype_var,
+                   *archetypes).pack()
+
+        LabelFrame(self.display_frame, text="Liczba postaci:")
+        self.display_frame.winfo_children()[-1].pack()
+        self.count_entry = Entry(self.display_frame.winfo_children()[-1])
+        self.count_entry.insert(END, 10)
+        self.count_entry.pack()
+
+        Button(self.display_frame, text="Generuj!",
+               command=self.new_npcs).pack(side=TOP)
+
+    def new_npcs(self):
+        """
+        Generate NPCs chosen in the create_npcs form and add them to the
+        self.persons dict.
+
+        """
+        try:
+            count = int(self.count_entry.get())
+        except ValueError:
+            self.message_label.configure(text="Podaj liczbę postaci!", bg="red")
+            return
+        names = self.populate_npcs(Archetype.Archetypes[self.archetype_var.get()],
+                                   count)
+        self.show_elements(self.persons)
+        self.message_label.configure(
+            text="Wygenerowano {0} postaci.".format(len(names)))
+
+    def populate_npcs(self, archetype: Archetype, count: int, rng=None):
+        """
+        Generate NPCs and stream them into the self.persons dict. Names of
+        already stored Persons are never overwritten.
+
+        :param archetype: an instance of the Archetype class.
+        :param count: int, number of NPCs to generate.
+        :param rng: an instance of random.Random, module generator by default.
+        :return: list, names of the new Persons.
+        """
+        return self.store_persons(person for _, person in
+                                  generate_npcs(archetype, count, rng))
+
+    def store_persons(self, persons):
+        """
+        Stream Persons into the self.persons dict as one undo-step. Persons
+        which names are already taken get the next free "<name> #<number>".
+
+        :param persons: iterable of the Person class instances.
+        :return: list, names of the stored Persons.
+        """
+        names = []
+        numbers = {}
+        with self.history.transaction(partial(self.show_elements,
+                                              self.persons)):
+            for person in persons:
+                name = person.name
+                if name in self.persons:
+                    base = name.rsplit(" #", 1)[0]
+                    number = numbers.get(base, 1)
+                    while name in self.persons:
+                        number += 1
+                        name = "{0} #{1}".format(base, number)
+                    numbers[base] = number
+                person.name = name
+                self.history.assign(self.persons, name, person,
+                                    partial(self.person_changed, name))
+                names.append(name)
+        return names
+
+    def show_encounters(self, location: Location):
+        """
+        Display the encounter table of a Location and the form for rolling
+        it's inhabitants.
+
+        :param location: an instance of the Location class.
+        """
+        self.clear(self.display_frame, self.test_frame)
+        Label(self.display_frame,
+              text="Spotkania: {0}".format(location.name)).pack(side=TOP)
+
+        lf = LabelFrame(self.display_frame, text="Tabela (nazwa: waga):")
+        lf.pack(side=TOP, fill=X)
+        self.encounters_text = Text(lf, width=40, height=10)
+        self.encounters_text.insert(END, "\n".join(
+            "{0}: {1}".format(name, weight)
+            for name, weight in location.encounters.entries))
+        self.encounters_text.pack()
+        Button(lf, text="Zapisz tabelę", bg="wheat",
+               command=partial(self.save_encounters, location)).pack(side=TOP)
+
+        lf = LabelFrame(self.display_frame, text="Liczebność:")
+        lf.pack(side=TOP)
+        self.patrol_entry = Entry(lf)
+        self.patrol_entry.insert(END, 4)
+        self.patrol_entry.pack(side=LEFT)
+        Button(lf, text="Losuj!",
+               command=partial(self.spawn_patrol, location)).pack(side=LEFT)
+
+        Button(self.display_frame, text="Pokaż na mapie", bg="grey80",
+               command=partial(self.show_on_map, location.address)).pack(
+            side=TOP)
+        Button(self.display_frame, text="Powrót", command=partial(
+            self.show_elements, self.locations)).pack(side=TOP)
+
+    def save_encounters(self, location: Location):
+        """
+        Replace the encounter table of a Location with the one typed in the
+        show_encounters form.
+
+        :param location: an instance of the Location class.
+        """
+        entries = []
+        try:
+            for line in self.encounters_text.get("1.0", END).splitlines():
+                if line.strip() == "":
+                    continue
+                name, _, weight = line.rpartition(":")
+                if name == "":
+                    name, weight = weight, "1"
+                entries.append((name.strip(), float(weight)))
+            encounters = EncounterTable(entries)
+        except ValueError as error:
+            self.message_label.configure(
+                text="Błędna tabela spotkań: {0}".format(error), bg="red")
+            return
+        unknown = [name for name, _ in entries if name not in self.persons
+                   and name not in Archetype.Archetypes]
+        self.history.assign(self.locations, location.name,
+                            Location(location.name, location.address,
+                                     location.description, encounters),
+                            partial(self.location_changed, location.name),
+                            partial(self.show_elements, self.locations))
+        self.show_encounters(self.locations[location.name])
+        if unknown:
+            self.message_label.configure(
+                text="Nieznane postaci: {0}".format(", ".join(unknown)),
+                bg="orange")
+
+    def spawn_patrol(self, location: Location, rng=None):
+        """
+        Roll the encounter table of a Location and display the drawn stored
+        Persons and freshly generated NPCs of drawn Archetypes.
+
+        :param location: an instance of the Location class.
+        :param rng: an instance of random.Random, module generator by default.
+        """
+        try:
+            size = int(self.patrol_entry.get())
+        except ValueError:
+            self.message_label.configure(text="Podaj liczebność!", bg="red")
+            return
+        drawn = Counter(location.encounters.draw_many(size, rng))
+        spawned = []
+        self.clear(self.test_frame)
+        lf = LabelFrame(self.test_frame, text="Mieszkańcy:")
+        lf.pack(side=TOP, fill=BOTH)
+
+        for name in drawn:
+            if name in Archetype.Archetypes:
+                npcs = [person for _, person in generate_npcs(
+                    Archetype.Archetypes[name], drawn[name], rng)]
+                spawned.extend(npcs)
+                for npc in npcs:
+                    Label(lf, text="{0} ({1})".format(npc.name, ", ".join(
+                        "{0} {1}".format(statistic[:3], npc.statistics[
+                            statistic].value)
+                        for statistic in Statistic.Statistics))).pack(
+                        side=TOP, anchor=W)
+            elif name in self.persons:
+                Button(lf, text="{0} x{1}".format(name, drawn[name]),
+                       command=partial(self.show_statistics,
+                                       self.persons[name])).pack(side=TOP,
+                                                                 anchor=W)
+            else:
+                Label(lf, text="{0} x{1}".format(name, drawn[name]),
+                      fg="red").pack(side=TOP, anchor=W)
+
+        def store_spawned():
+            self.store_persons(spawned)
+            save_button.destroy()
+
+        if spawned:
+            save_button = Button(self.test_frame, text="Zapisz wygenerowanych",
+                                 bg="wheat", command=store_spawned)
+            save_button.pack(side=TOP)
+
     def create_location(self, location: Location = None):
         """
         Fulfill data fields for a new Location to be added.
@@ -906,22 +2947,21 @@ class Application:
         self.name_entry = Entry(lfn)
         self.name_entry.pack()
         if location is not None:
-            self.name_entry.insert(END, self.locations[location].name)
+            self.name_entry.insert(END, location.name)
 
         lfa = LabelFrame(self.display_frame, text="Adres:")
         self.display_frame.winfo_children()[-1].pack()
         self.address_entry = Entry(lfa)
         self.address_entry.pack()
         if location is not None:
-            self.address_entry.insert(END, str(self.locations[location].address))
+            self.address_entry.insert(END, str(location.address))
 
         lfd = LabelFrame(self.display_frame, text="Opis:")
         self.display_frame.winfo_children()[-1].pack()
         self.desc_entry = Entry(lfd)
         self.desc_entry.pack()
         if location is not None:
-            self.desc_entry.insert(END,
-                                   str(self.locations[location].description))
+            self.desc_entry.insert(END, str(location.description))
 
         Button(self.display_frame, text="Zapisz!", command=self.new_location).pack(side=TOP)
 
@@ -933,19 +2973,24 @@ class Application:
         name = self.name_entry.get()
         address = self.address_entry.get()
         desc = self.desc_entry.get()
+        encounters = self.locations[name].encounters \
+            if name in self.locations else None
 
-        self.locations[name] = Location(name, address, desc)
+        self.history.assign(self.locations, name,
+                            Location(name, address, desc, encounters),
+                            partial(self.location_changed, name),
+                            partial(self.show_elements, self.locations))
+        self.show_elements(self.locations)
 
     def save(self):
         """
-        Saves self.persons dict to the file. Called automatically when the
-        application is closed.
+        Saves changed Persons and Locations, and the new rolls to the file.
+        Called automatically when the application is closed.
 
         """
-        shelf_file = shelve.open("saved_data")
-        shelf_file['persons'] = self.persons
-        shelf_file['locations'] = self.locations
-        shelf_file.close()
+        self.push_and_pull()
+        self.store.save_rolls(self.roll_history, self.saved_rolls)
+        self.saved_rolls = len(self.roll_history)
 
     def load(self):
         """
@@ -953,17 +2998,120 @@ class Application:
         the start of application.
 
         """
-        shelf_file = shelve.open("saved_data")
-        if 'persons' in shelf_file.keys() and 'locations' in shelf_file.keys():
-            self.persons = shelf_file['persons']
-            self.locations = shelf_file['locations']
+        self.persons, self.locations, self.roll_history = self.store.load()
+        if self.persons or self.locations:
             self.message_label.configure(
                 text="{0} characters, and {1} locations loaded successfully.".format(
-                    str(len(self.persons) - 1), str(len(self.locations) - 1)))
-        else:
-            self.persons = {}
-            self.locations = {}
-        shelf_file.close()
+                    str(len(self.persons)), str(len(self.locations))))
+
+    def synchronize(self):
+        """
+        Exchange changed records with other instances of the application.
+        Called periodically.
+
+        """
+        if self.dirty or self.store.changed_elsewhere():
+            self.push_and_pull()
+        self.mainframe.after(self.SyncInterval, self.synchronize)
+
+    def push_and_pull(self):
+        """
+        Write Persons and Locations changed since the last synchronization and
+        apply ones changed meanwhile by other instances. Changed records are
+        updated in place, so opened windows and the undo history keep working
+        on the current objects.
+
+        """
+        collections = {"person": self.persons, "location": self.locations}
+        records = {(kind, name): collections[kind].get(name)
+                   for kind, name in self.dirty}
+        self.dirty.clear()
+        remote, complete = self.store.sync(records)
+
+        if complete:
+            for kind in collections:
+                for name in list(collections[kind]):
+                    if name != "Type" and (kind, name) not in remote and \
+                            (kind, name) not in records:
+                        remote[(kind, name)] = None
+        for kind, name in remote:
+            old = collections[kind].get(name)
+            if remote[(kind, name)] is None:
+                collections[kind].pop(name, None)
+            elif old is not None:
+                old.update(remote[(kind, name)])
+            else:
+                collections[kind][name] = remote[(kind, name)]
+            if kind == "location":
+                self.location_changed(name)
+            else:
+                self.person_changed(name)
+        self.dirty.difference_update(remote)
+
+        if remote:
+            self.message_label.configure(
+                text="Zmiany z innego okna: {0}".format(len(remote)),
+                bg="lightblue")
+
+    def export_campaign(self):
+        """
+        Export all Persons and Locations to the chunked archive in a directory
+        chosen by the user.
+
+        """
+        path = filedialog.askdirectory()
+        if not path:
+            return
+        manifest = export_archive(path, {"persons": self.persons,
+                                         "locations": self.locations})
+        counts = {name: sum(chunk["count"] for chunk in chunks)
+                  for name, chunks in manifest["collections"].items()}
+        self.message_label.configure(
+            text="Wyeksportowano {0} postaci i {1} miejsc.".format(
+                counts["persons"], counts["locations"]))
+
+    def import_campaign(self):
+        """
+        Import Persons and Locations from the chunked archive in a directory
+        chosen by the user. Records with the same names are replaced and the
+        whole import could be undone at once.
+
+        """
+        path = filedialog.askdirectory()
+        if not path:
+            return
+        try:
+            collections = import_archive(path)
+        except (OSError, ValueError, pickle.UnpicklingError) as error:
+            self.message_label.configure(
+                text="Nie udało się wczytać archiwum: {0}".format(error),
+                bg="red")
+            return
+        persons, locations = self.import_records(collections)
+        self.show_elements(self.persons)
+        self.message_label.configure(
+            text="Zaimportowano {0} postaci i {1} miejsc.".format(
+                persons, locations))
+
+    def import_records(self, collections: dict):
+        """
+        Put imported Persons and Locations into the dicts as one undo-step,
+        replacing records with the same names.
+
+        :param collections: dict, returned by the import_archive function.
+        :return: tuple, (number of Persons, number of Locations).
+        """
+        persons = collections.get("persons", {})
+        locations = collections.get("locations", {})
+        with self.history.transaction(partial(self.show_elements,
+                                              self.persons)):
+            for name in persons:
+                self.history.assign(self.persons, name, persons[name],
+                                    partial(self.person_changed, name))
+            for name in locations:
+                self.history.assign(self.locations, name, locations[name],
+                                    partial(self.location_changed, name))
+        return len(persons), len(locations)
 
     def close_application(self):
         """
@@ -974,19 +3122,364 @@ class Application:
         self.mainframe.destroy()
 
 
-def check_required(person: Person):
+DIFFICULTY_TABLE = DifficultyTable()
+
+
+def resolve_test(dice: list, value: int, difficulty: int, sliders: int = 0,
+                 skill_points: int = None):
+    """
+    Resolve a 3d20 test of a Statistic, or of a Skill if skill_points are
+    provided.
+
+    :param dice: list, three results rolled on d20.
+    :param value: int, value of the tested (or linked) Statistic.
+    :param difficulty: int, difficulty level of the test (-2 to 7).
+    :param sliders: int, sliders provided by Tricks (Skill tests only).
+    :param skill_points: int, points of the tested Skill, None for Statistics.
+    :return: list, [passed, dice, two kept dice after Skill points, success or
+        fail points, tested value] and for Skills also the two kept dice before
+        Skill points were used.
+    """
+    if skill_points is None:
+        modifier = DIFFICULTY_TABLE.modifier(difficulty, 0, 0, dice.count(1),
+                                             dice.count(20))
+    else:
+        modifier = DIFFICULTY_TABLE.modifier(difficulty, sliders, skill_points,
+                                             dice.count(1), dice.count(20))
+    tested_value = value - modifier
+
+    kept = list(dice)
+    kept.remove(max(kept))
+    if skill_points is None:
+        highest = max(kept)
+        return [highest <= tested_value, list(dice), kept,
+                abs(highest - tested_value), tested_value]
+
+    first, second = kept
+    for _ in range(0, skill_points):
+        highest = max(first, second)
+        if highest <= 1:
+            break
+        if first == highest:
+            first -= 1
+        else:
+            second -= 1
+    highest = max(first, second)
+    return [highest <= tested_value, list(dice), [first, second],
+            abs(highest - tested_value), tested_value, kept]
+
+
+def resolve_tests(dice_stream, value: int, difficulty: int, sliders: int = 0,
+                  skill_points: int = None):
+    """
+    Resolve many tests of the same Statistic or Skill with one lookup of the
+    difficulty table. Only outcomes are computed, without intermediate dice.
+
+    :param dice_stream: iterable of (d20, d20, d20) tuples.
+    :param value: int, value of the tested (or linked) Statistic.
+    :param difficulty: int, difficulty level of the test (-2 to 7).
+    :param sliders: int, sliders provided by Tricks (Skill tests only).
+    :param skill_points: int, points of the tested Skill, None for Statistics.
+    :return: list of (passed, points) tuples.
+    """
+    if skill_points is None:
+        start = DIFFICULTY_TABLE.row(difficulty)
+        points = 0
+    else:
+        start = DIFFICULTY_TABLE.row(difficulty, sliders, skill_points)
+        points = skill_points
+    tested_values = [value - modifier
+                     for modifier in DIFFICULTY_TABLE.values[start:start + 16]]
+    results = []
+    for a, b, c in dice_stream:
+        tested_value = tested_values[4 * ((a == 1) + (b == 1) + (c == 1)) +
+                                     (a == 20) + (b == 20) + (c == 20)]
+        if a >= b and a >= c:
+            low, high = (b, c) if b <= c else (c, b)
+        elif b >= c:
+            low, high = (a, c) if a <= c else (c, a)
+        else:
+            low, high = (a, b) if a <= b else (b, a)
+        highest = reduce_dice(low, high, points)
+        results.append((highest <= tested_value, abs(highest - tested_value)))
+    return results
+
+
+def reduce_dice(low: int, high: int, points: int):
+    """
+    Compute the higher of two kept dice after Skill points lowered them, one
+    point at a time always from the higher die, never below 1.
+
+    :param low: int, lower of the kept dice.
+    :param high: int, higher of the kept dice.
+    :param points: int, Skill points.
+    :return: int, higher die after the reduction.
+    """
+    gap = high - low
+    if points <= gap:
+        return high - points
+    points -= gap
+    return max(low - points // 2, 1)
+
+
+ALL_DICE = [(a, b, c) for a in range(1, 21) for b in range(1, 21)
+            for c in range(1, 21)]
+
+
+@lru_cache(maxsize=4096)
+def test_probability(value: int, difficulty: int, sliders: int = 0,
+                     skill_points: int = None):
+    """
+    Compute an exact probability of passing a test over all 8000 possible
+    results on 3d20.
+
+    :param value: int, value of the tested (or linked) Statistic.
+    :param difficulty: int, difficulty level of the test (-2 to 7).
+    :param sliders: int, sliders provided by Tricks (Skill tests only).
+    :param skill_points: int, points of the tested Skill, None for Statistics.
+    :return: float, probability in range 0-1.
+    """
+    results = resolve_tests(ALL_DICE, value, difficulty, sliders, skill_points)
+    return sum(passed for passed, _ in results) / len(results)
+
+
+ARCHIVE_CODECS = {"zlib": (zlib.compress, zlib.decompress),
+                  "lzma": (lzma.compress, lzma.decompress)}
+
+ARCHIVE_SOURCE = {}
+
+
+class ArchiveUnpickler(pickle.Unpickler):
+    """
+    Unpickler of archive chunks. Archives are shared between game-masters, so
+    only the classes of records could be created from them, never arbitrary
+    objects or functions.
+    """
+
+    Modules = ("__main__", "game_master_app", __name__)
+    Classes = ("Person", "Statistic", "Skill", "Trick", "Location",
+               "EncounterTable")
+
+    def find_class(self, module: str, name: str):
+        if module in self.Modules and name in self.Classes:
+            return globals()[name]
+        raise pickle.UnpicklingError("niedozwolony obiekt {0}.{1}".format(
+            module, name))
+
+
+def pack_chunk(codec: str, name: str, start: int, stop: int):
+    """
+    Pickle and compress one chunk of the exported records. Runs in forked
+    worker processes, which inherit the records in ARCHIVE_SOURCE, so they do
+    not have to be sent to them.
+
+    :param codec: str, "zlib" or "lzma".
+    :param name: str, name of the exported collection.
+    :param start: int, index of the first record of the chunk.
+    :param stop: int, index after the last record of the chunk.
+    :return: bytes, compressed chunk.
+    """
+    records = ARCHIVE_SOURCE[name][start:stop]
+    return ARCHIVE_CODECS[codec][0](pickle.dumps(dict(records),
+                                                 pickle.HIGHEST_PROTOCOL))
+
+
+def export_archive(path: str, collections: dict, chunk_size: int = 500,
+                   codec: str = "zlib", workers: int = None):
+    """
+    Save collections of records as a chunked, compressed archive: one file per
+    chunk and a manifest.json describing them. Chunks are pickled and
+    compressed in a pool of forked processes, one per core. Processes are
+    forked only on Linux: Windows has no fork and forking a process running
+    Tk is unsafe on macOS. There a thread pool is used instead, and then only
+    the compression runs in parallel, since pickling holds the GIL.
+
+    :param path: str, directory of the archive.
+    :param collections: dict, name of collection -> dict of records.
+    :param chunk_size: int, number of records in one chunk.
+    :param codec: str, "zlib" or "lzma".
+    :param workers: int, number of workers, by default one per core.
+    :return: dict, manifest of the archive.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = {"version": 1, "codec": codec, "collections": {}}
+    for name in collections:
+        ARCHIVE_SOURCE[name] = [(key, collections[name][key])
+                                for key in collections[name] if key != "Type"]
+    workers = min(workers or os.cpu_count() or 1, max(sum(
+        -(-len(records) // chunk_size) for records in ARCHIVE_SOURCE.values()),
+        1))
+    if sys.platform.startswith("linux"):
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("fork"))
+    else:
+        executor = ThreadPoolExecutor(workers)
+    try:
+        with executor:
+            for name in collections:
+                count = len(ARCHIVE_SOURCE[name])
+                starts = range(0, count, chunk_size)
+                chunks = []
+                for i, data in enumerate(executor.map(
+                        pack_chunk, [codec] * len(starts),
+                        [name] * len(starts), starts,
+                        [start + chunk_size for start in starts])):
+                    file_name = "{0}-{1:04d}.{2}".format(name, i, codec)
+                    with open(os.path.join(path, file_name), "wb") as \
+                            chunk_file:
+                        chunk_file.write(data)
+                    chunks.append({"file": file_name,
+                                   "count": min(chunk_size,
+                                                count - i * chunk_size),
+                                   "crc32": zlib.crc32(data)})
+                manifest["collections"][name] = chunks
+    finally:
+        ARCHIVE_SOURCE.clear()
+
+    manifest_path = os.path.join(path, "manifest.json")
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def import_archive(path: str, workers: int = None):
+    """
+    Load collections of records saved with export_archive. Chunks are read,
+    verified and decompressed in a thread pool, but unpickled one by one in
+    this thread: the records have to be created in this process, so worker
+    processes would only pickle them again. Unpickling takes most of the
+    loading time and does not scale with cores.
+
+    Only the classes of records are unpickled (see ArchiveUnpickler), so an
+    archive received from somebody else cannot run code, but it still could
+    hold any values of their attributes.
+
+    :param path: str, directory of the archive.
+    :param workers: int, number of threads, by default one per core.
+    :return: dict, name of collection -> dict of records.
+    """
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as \
+            manifest_file:
+        manifest = json.load(manifest_file)
+    decompress = ARCHIVE_CODECS[manifest["codec"]][1]
+
+    def read_chunk(chunk: dict):
+        with open(os.path.join(path, chunk["file"]), "rb") as chunk_file:
+            data = chunk_file.read()
+        if zlib.crc32(data) != chunk["crc32"]:
+            raise ValueError("uszkodzony plik {0}".format(chunk["file"]))
+        return decompress(data)
+
+    collections = {}
+    with ThreadPoolExecutor(workers) as executor:
+        for name in manifest["collections"]:
+            collections[name] = {}
+            for data in executor.map(read_chunk,
+                                     manifest["collections"][name]):
+                collections[name].update(
+                    ArchiveUnpickler(io.BytesIO(data)).load())
+    return collections
+
+
+EARTH_RADIUS = 6371.0
+
+COORDINATE = r"(-?\d{1,3}(?:\.\d+)?)"
+
+COORDINATE_PATTERNS = [
+    regex.compile(r"!3d" + COORDINATE + r"!4d" + COORDINATE),
+    regex.compile(r"[?&](?:q|query|ll|destination)=" + COORDINATE +
+                  r"(?:,|%2C)(?:\s|\+|%20)*" + COORDINATE),
+    regex.compile(r"@" + COORDINATE + r"," + COORDINATE),
+    regex.compile(r"^\s*" + COORDINATE + r"\s*[,;]\s*" + COORDINATE + r"\s*$"),
+]
+
+
+def parse_coordinates(address: str):
+    """
+    Retrieve a geographic coordinates from the g-maps link or from a plain
+    'latitude, longitude' text.
+
+    :param address: str, http address to the g-maps geo-location of place.
+    :return: tuple, (latitude, longitude) or None if address has no coordinates.
+    """
+    if not address:
+        return None
+    for pattern in COORDINATE_PATTERNS:
+        match = pattern.search(address)
+        if match is not None:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return latitude, longitude
+    return None
+
+
+def distance_km(origin: tuple, target: tuple):
+    """
+    Compute great-circle (haversine) distance between two points.
+
+    :param origin: tuple, (latitude, longitude) of the first point.
+    :param target: tuple, (latitude, longitude) of the second point.
+    :return: float, distance in kilometers.
+    """
+    lat1, lng1 = math.radians(origin[0]), math.radians(origin[1])
+    lat2, lng2 = math.radians(target[0]), math.radians(target[1])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def unit_vector(coordinates: tuple):
+    """Convert (latitude, longitude) to the point on an unit sphere."""
+    latitude, longitude = math.radians(coordinates[0]), \
+        math.radians(coordinates[1])
+    return (math.cos(latitude) * math.cos(longitude),
+            math.cos(latitude) * math.sin(longitude), math.sin(latitude))
+
+
+def squared_distance(a: tuple, b: tuple):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+# Cumulative weights of Statistic values 8-20: uniform for most Statistics,
+# growing linearly with the value for the main ones of an Archetype.
+STATISTIC_CUM_WEIGHTS = list(accumulate([1] * 13))
+
+MAIN_STATISTIC_CUM_WEIGHTS = list(accumulate(range(1, 14)))
+
+POLISH_LETTERS = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+STOP_WORDS = {"a", "i", "o", "u", "w", "z", "ze", "na", "do", "od", "po", "za",
+              "sie", "to", "jest", "nie", "oraz", "lub", "jak", "co", "przy"}
+
+SUFFIXES = sorted(["ami", "ach", "ego", "emu", "ymi", "imi", "owi", "iem",
+                   "ow", "om", "ej", "ym", "im", "ie", "a", "e", "i", "o",
+                   "u", "y"], key=len, reverse=True)
+
+
+def fold(text: str):
+    """Lowercase a text and strip it of Polish diacritics."""
+    return text.lower().translate(POLISH_LETTERS)
+
+
+def tokenize(text: str):
     """
-    Check if a Person has all required Statistics. Returns boolean.
+    Split a text to the searchable terms: lowercase, without Polish diacritics
+    and with the most common inflection-endings cut off.
 
-    :param person: an instance of the Person class.
-    :return: bool, if there is enough Statistics created.
+    :param text: str, text to be tokenized.
+    :return: list of str terms.
     """
-    stats_count = 0
-    for stat in person.statistics:
-        if isinstance(person.statistics[stat], Statistic):
-            if person.statistics[stat].value > 0:
-                stats_count += 1
-    return stats_count == 6
+    terms = []
+    for word in regex.findall(r"[^\W_]+", fold(text)):
+        if word in STOP_WORDS:
+            continue
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        terms.append(word)
+    return terms
 
 
 if __name__ == '__main__':